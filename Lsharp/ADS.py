@@ -26,8 +26,40 @@ class AdsNode:
         return self.score
 
 
+class AdsCache:
+    def __init__(self, max_size=100000):
+        """
+        Cache of constructed ADS (sub)trees keyed on the block of tree nodes they split. An entry stays valid as long
+        as the subtrees of the nodes in its block did not grow, which is checked with the node version stamps.
+        """
+        self.max_size = max_size
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, block_key, version_of):
+        """ Returns the cached ADS node for the block, or None if it is missing or outdated """
+        entry = self.entries.get(block_key)
+        if entry is not None:
+            version, ads_node = entry
+            if all(version_of(node) <= version for node in block_key):
+                self.hits += 1
+                return ads_node
+            del self.entries[block_key]
+        self.misses += 1
+        return None
+
+    def put(self, block_key, version, ads_node):
+        """ Stores the ADS node computed for the block at the given tree version """
+        if len(self.entries) >= self.max_size:
+            del self.entries[next(iter(self.entries))]
+        self.entries[block_key] = (version, ads_node)
+
+
 class Ads:
-    def __init__(self, obs_tree, current_block : set):
+    def __init__(self, obs_tree, current_block : set, cache : AdsCache = None):
+        self.cache = cache
+        self.memo = {}
         self.initial_node = self.construct_ads(obs_tree, current_block)
         self.current_node = self.initial_node
 
@@ -36,10 +68,24 @@ class Ads:
         return self.initial_node.get_score()
 
     def construct_ads(self, obs_tree, current_block):
-        """ builds the ADS tree recursively by selecting optimal inputs for splitting states """
+        """ builds the ADS tree recursively, reusing the subtrees already built for the same block """
         if len(current_block) == 1:
             return AdsNode.create_leaf()
 
+        block_key = frozenset(current_block)
+        ads_node = self.memo.get(block_key)
+        if ads_node is None and self.cache is not None:
+            ads_node = self.cache.get(block_key, lambda node: node.version)
+        if ads_node is None:
+            ads_node = self._construct_ads_node(obs_tree, block_key)
+            if self.cache is not None:
+                self.cache.put(block_key, obs_tree.version, ads_node)
+        self.memo[block_key] = ads_node
+        return ads_node
+
+    def _construct_ads_node(self, obs_tree, current_block):
+        """ selects the optimal input for splitting the states, skipping inputs whose score bound cannot win """
+
         split_score = {}
         best_input = self.maximal_base_input(obs_tree.alphabet, current_block, split_score)
 
@@ -47,7 +93,8 @@ class Ads:
         sub_trees = sum(len(part) for part in partitions.values())
         max_input_score = sum(self.make_subtree(obs_tree, sub_trees, part) for _, part in partitions.items())
 
-        inputs_to_keep = {i for i, (apart, non_apart) in split_score.items() if apart + non_apart >= max_input_score}
+        # a list in alphabet order, so ties between inputs are broken the same way in every run
+        inputs_to_keep = [i for i, (apart, non_apart) in split_score.items() if apart + non_apart >= max_input_score]
 
         if not inputs_to_keep:
             raise RuntimeError("No input available during ADS computation")
@@ -59,6 +106,13 @@ class Ads:
         for input_val in inputs_to_keep:
             input_partitions = self.partition_on_output(current_block, input_val)
             sub_trees_size = sum(len(part) for part in input_partitions.values())
+
+            # a block of n states scores at most n * (n - 1), the number of ordered pairs it can separate
+            score_bound = sum(self.compute_reg_score(len(part), sub_trees_size, len(part) * (len(part) - 1))
+                              for part in input_partitions.values())
+            if score_bound < max_input_score or (best_input is not None and score_bound <= best_score):
+                continue
+
             input_score = 0
             children = {}
 
@@ -1,4 +1,6 @@
 from collections import deque
+from VectorizedApartness import VectorizedApartness
+from CompiledHypothesis import CompiledHypothesis
 
 class Apartness:
     @staticmethod
@@ -18,6 +20,18 @@ class Apartness:
         """
         return Apartness._show_states_are_apart(state1, state2, ob_tree.alphabet) is not None
 
+    @staticmethod
+    def pairs_are_apart(first_states, second_states, ob_tree):
+        """
+        Checks for each pair of states if they are apart, all pairs at once on trees supported by the vectorized kernel
+        """
+        if VectorizedApartness.supports(ob_tree):
+            return [conflict is not None for conflict in VectorizedApartness.find_conflicts(first_states, second_states, ob_tree)]
+        return [
+            Apartness._show_states_are_apart(first, second, ob_tree.alphabet) is not None
+            for first, second in zip(first_states, second_states)
+        ]
+
     @staticmethod
     def _show_states_are_apart(first, second, alphabet):
         """
@@ -42,9 +56,16 @@ class Apartness:
     @staticmethod
     def compute_witness_in_tree_and_hypothesis(ob_tree, hypothesis):
         """
-        Finds a distinguishing sequence between the observation tree and the hypothesis if they differ
+        Finds a distinguishing sequence between the observation tree and the hypothesis if they differ.
+        The hypothesis is compiled to tables first unless a CompiledHypothesis is passed.
         """
-        tree_destination = Apartness._show_states_are_apart_in_tree_and_hypothesis(hypothesis, ob_tree)
+        if not isinstance(hypothesis, CompiledHypothesis):
+            hypothesis = CompiledHypothesis(hypothesis, ob_tree.alphabet)
+
+        if VectorizedApartness.supports(ob_tree):
+            tree_destination = VectorizedApartness.find_hypothesis_conflict(ob_tree, hypothesis)
+        else:
+            tree_destination = Apartness._show_states_are_apart_in_tree_and_hypothesis(hypothesis, ob_tree)
         if not tree_destination:
             return
         return ob_tree.get_transfer_sequence(ob_tree.root, tree_destination)
@@ -52,21 +73,25 @@ class Apartness:
     @staticmethod
     def _show_states_are_apart_in_tree_and_hypothesis(hypothesis, ob_tree):
         """
-        Determines if the observation tree and the hypothesis are distinguishable based on their state outputs
+        Determines if the observation tree and the compiled hypothesis are distinguishable based on their state outputs
         """
         pairs = deque([(ob_tree.root, hypothesis.initial_state)])
+        alphabet_size = hypothesis.alphabet_size
+        input_index = hypothesis.input_index
+        output_values = hypothesis.output_values
 
         while pairs:
             tree_state, hyp_state = pairs.popleft()
 
             for input_val in ob_tree.alphabet:
                 tree_output = tree_state.get_output(input_val)
-                hyp_output = hyp_state.output_fun[input_val]
+                slot = hyp_state * alphabet_size + input_index[input_val]
+                hyp_output = output_values[hypothesis.outputs[slot]]
 
                 if tree_output is not None and hyp_output is not None:
                     if tree_output != hyp_output: 
                         return tree_state.get_successor(input_val)
                     
-                    pairs.append((tree_state.get_successor(input_val), hyp_state.transitions[input_val]))
+                    pairs.append((tree_state.get_successor(input_val), hypothesis.transitions[slot]))
 
-        return None
\ No newline at end of file
+        return None
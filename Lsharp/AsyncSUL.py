@@ -0,0 +1,189 @@
+import asyncio
+from abc import ABC, abstractmethod
+
+from aalpy.base import SUL
+
+class AsyncSUL(ABC):
+    """
+    System under learning with coroutine methods, for systems (e.g. network protocol implementations) that spend
+    most of their time waiting on I/O. Mirrors the interface of aalpy.base.SUL.
+    """
+    def __init__(self):
+        self.num_queries = 0
+        self.num_steps = 0
+
+    @abstractmethod
+    async def pre(self):
+        """ Resets the system """
+        pass
+
+    @abstractmethod
+    async def post(self):
+        """ Performs additional cleanup on the system if necessary """
+        pass
+
+    @abstractmethod
+    async def step(self, letter):
+        """ Executes an input on the system and returns its output """
+        pass
+
+    async def query(self, word):
+        """ Performs an output query, returns the list of outputs """
+        await self.pre()
+        try:
+            outputs = [await self.step(letter) for letter in word]
+        finally:
+            await self.post()
+        self.num_queries += 1
+        self.num_steps += len(word)
+        return outputs
+
+    async def adaptive_query(self, word, ads):
+        """ Performs an adaptive output query, the next input of the ADS depends on the previous output """
+        await self.pre()
+        try:
+            outputs_received = [await self.step(letter) for letter in word]
+            last_output = None
+            while True:
+                next_input = ads.next_input(last_output)
+                if next_input is None:
+                    break
+                word.append(next_input)
+                last_output = await self.step(next_input)
+                outputs_received.append(last_output)
+        finally:
+            await self.post()
+        self.num_queries += 1
+        self.num_steps += len(word)
+        return word, outputs_received
+
+
+class AsyncSULPool:
+    """
+    Pool of connections (AsyncSUL instances) to the same system, so that many queries can be in flight at once
+    """
+    def __init__(self, suls):
+        self.suls = suls
+        self.free_suls = None
+
+    async def acquire(self):
+        """ Waits for a free connection """
+        if self.free_suls is None:
+            self.free_suls = asyncio.Queue()
+            for sul in self.suls:
+                self.free_suls.put_nowait(sul)
+        return await self.free_suls.get()
+
+    async def release(self, sul):
+        """ Returns a connection to the pool """
+        self.free_suls.put_nowait(sul)
+
+    async def query(self, word):
+        """ Performs an output query on a free connection """
+        sul = await self.acquire()
+        try:
+            return await sul.query(word)
+        finally:
+            await self.release(sul)
+
+    async def adaptive_query(self, word, ads):
+        """ Performs an adaptive output query on a free connection """
+        sul = await self.acquire()
+        try:
+            return await sul.adaptive_query(word, ads)
+        finally:
+            await self.release(sul)
+
+    async def query_all(self, queries):
+        """ Performs all output queries concurrently, returns the outputs in the order of the queries """
+        return await asyncio.gather(*(self.query(query) for query in queries))
+
+    async def adaptive_query_all(self, queries):
+        """ Performs all adaptive output queries (word, ads) concurrently, returns the results in the order of the queries """
+        return await asyncio.gather(*(self.adaptive_query(word, ads) for word, ads in queries))
+
+
+class AsyncSULBridge(SUL):
+    """
+    Synchronous SUL on top of an AsyncSULPool, for the learner and oracle running in a worker thread
+    (see Lsharp.run_Lsharp_async) while the connections are driven by the event loop.
+    Must be created from a coroutine running on that event loop, unless the loop is passed explicitly.
+    """
+    def __init__(self, pool, loop=None):
+        super().__init__()
+        self.pool = pool
+        self.loop = loop or asyncio.get_running_loop()
+        self.connection = None
+        self.pending_reset = False
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def pre(self):
+        # the connection is only taken from the pool at the first step, so a reset without steps holds nothing
+        self.pending_reset = True
+
+    def post(self):
+        if self.connection is not None:
+            connection, self.connection = self.connection, None
+            self._run(connection.post())
+            self._run(self.pool.release(connection))
+        self.pending_reset = False
+
+    def step(self, letter):
+        if self.connection is None:
+            self.connection = self._run(self.pool.acquire())
+            self.pending_reset = True
+        if self.pending_reset:
+            self._run(self.connection.pre())
+            self.pending_reset = False
+        self.num_steps += 1
+        return self._run(self.connection.step(letter))
+
+    def query(self, word):
+        self.post()
+        self.num_queries += 1
+        self.num_steps += len(word)
+        return self._run(self.pool.query(list(word)))
+
+    def adaptive_query(self, word, ads):
+        self.post()
+        word, outputs = self._run(self.pool.adaptive_query(word, ads))
+        self.num_queries += 1
+        self.num_steps += len(word)
+        return word, outputs
+
+    def query_all(self, queries):
+        """ Performs all output queries concurrently on the pool, returns the outputs in the order of the queries """
+        self.post()
+        self.num_queries += len(queries)
+        self.num_steps += sum(len(query) for query in queries)
+        return self._run(self.pool.query_all([list(query) for query in queries]))
+
+    def adaptive_query_all(self, queries):
+        """ Performs all adaptive output queries (word, ads) concurrently on the pool, every ads needs its own state """
+        self.post()
+        results = self._run(self.pool.adaptive_query_all([(list(word), ads) for word, ads in queries]))
+        self.num_queries += len(queries)
+        self.num_steps += sum(len(word) for word, _ in results)
+        return results
+
+
+class AsyncQueryExecutor:
+    """
+    Query executor for the QueryScheduler that keeps a whole batch of queries in flight over the connection pool
+    """
+    def __init__(self, bridge):
+        self.bridge = bridge
+
+    def run(self, queries):
+        """ Returns the outputs of the SUL for every query """
+        return self.bridge.query_all(queries)
+
+    def run_adaptive(self, queries):
+        """ Returns the inputs and outputs of the SUL for every adaptive query (inputs, ads) """
+        return self.bridge.adaptive_query_all(queries)
+
+    def close(self):
+        """ The connections belong to the pool """
+        pass
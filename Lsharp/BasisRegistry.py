@@ -0,0 +1,59 @@
+class BasisRegistry:
+    """
+    The basis states in the order they were added, each with a dense index. A set of basis states (the candidates of
+    a frontier state) is an integer bitmask in which bit i stands for the basis state with index i, so removing
+    candidates, counting them and taking the only one are bit operations.
+    Iterating the registry gives the basis states in order, so the run does not depend on the hashes of tree nodes.
+    """
+    def __init__(self):
+        self.states = []
+        self.index = {}
+
+    def __len__(self):
+        return len(self.states)
+
+    def __iter__(self):
+        return iter(self.states)
+
+    def __contains__(self, state):
+        return state in self.index
+
+    def add(self, basis_state):
+        """
+        Adds a basis state at the next index if it is not in the basis yet
+        """
+        if basis_state not in self.index:
+            self.index[basis_state] = len(self.states)
+            self.states.append(basis_state)
+
+    def get_bit(self, basis_state):
+        """
+        Returns the mask with only the bit of the basis state
+        """
+        return 1 << self.index[basis_state]
+
+    def get_mask(self, basis_states):
+        """
+        Returns the mask of the given basis states
+        """
+        mask = 0
+        for basis_state in basis_states:
+            mask |= 1 << self.index[basis_state]
+        return mask
+
+    def get_states(self, mask):
+        """
+        Returns the basis states in the mask, in order of their index
+        """
+        states = []
+        while mask:
+            lowest_bit = mask & -mask
+            states.append(self.states[lowest_bit.bit_length() - 1])
+            mask ^= lowest_bit
+        return states
+
+    def get_first(self, mask):
+        """
+        Returns the basis state with the lowest index in the (non-empty) mask
+        """
+        return self.states[(mask & -mask).bit_length() - 1]
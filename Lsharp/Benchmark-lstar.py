@@ -3,6 +3,7 @@ from aalpy.utils import load_automaton_from_file
 from aalpy.SULs import MealySUL
 from aalpy.oracles import PerfectKnowledgeEqOracle
 from WMethodEqOracleMealy import WMethodEqOracleMealy
+from QueryCache import QueryCache, CachedSUL
 import timeit
 import csv, os
 
@@ -14,6 +15,10 @@ folder = "Experiment Results"
 result_file = "Experiment3 Lstar.csv"
 file_path = os.path.join(folder, result_file)
 
+# Set to a QueryCache to answer repeated queries from disk, across runs and with the other benchmark script,
+# e.g. QueryCache(os.path.join(folder, "query-cache.sqlite")). The learn and test metrics still count every query.
+query_cache = None
+
 
 if not os.path.exists(file_path):
     with open(file_path,mode="w",newline="") as file:
@@ -33,12 +38,16 @@ def benchmark(dot_file):
     input_al = mealy_machine.get_input_alphabet()
 
     sul_mealy = MealySUL(mealy_machine)
+    if query_cache is not None:
+        sul_mealy = CachedSUL(sul_mealy, query_cache, dot_file)
 
     # perfect_oracle = PerfectKnowledgeEqOracle(input_al, sul_mealy, mealy_machine)
     w_method_oracle = WMethodEqOracleMealy(input_al, sul_mealy, 2, add_to_tree=False)
     # state_prefix_oracle = StatePrefixEqOracle(input_al, sul_mealy, 50, 100)
 
     learned_automaton, data = run_Lstar(input_al, sul_mealy, w_method_oracle, automaton_type='mealy', cache_and_non_det_check=True, cex_processing='rs', return_data=True, print_level=0)
+    if query_cache is not None:
+        sul_mealy.close()
 
 all_models = ["ASN_learnresult_SecureCode Aut_fix", "1_learnresult_MasterCard_fix", "LoesTarget", "Rabo_learnresult_SecureCode_Aut_fix", 
             "Rabo_learnresult_MAESTRO_fix", "ASN_learnresult_MAESTRO_fix", "4_learnresult_MAESTRO_fix", "10_learnresult_MasterCard_fix", 
@@ -0,0 +1,64 @@
+from ObservationTree import ObservationTree
+from CompactObservationTree import CompactObservationTree
+from aalpy.utils import load_automaton_from_file
+from aalpy.SULs import MealySUL
+import random
+import timeit
+
+# Micro-benchmark of observation tree inserts and lookups on long traces, with and without alphabet validation
+dot_file = "TCP_Linux_Client"
+number_of_traces = 200
+trace_length = 500
+repetitions = 7
+
+mealy_machine = load_automaton_from_file(f'Lsharp/DotFiles/{dot_file}.dot', automaton_type='mealy')
+input_al = mealy_machine.get_input_alphabet()
+sul_mealy = MealySUL(mealy_machine)
+
+random.seed(1)
+traces = []
+for _ in range(number_of_traces):
+    inputs = tuple(random.choice(input_al) for _ in range(trace_length))
+    traces.append((inputs, sul_mealy.query(inputs)))
+
+def validate_per_input(ob_tree, inputs):
+    # alphabet check as done before the set based validation, one membership test per input
+    for input_val in inputs:
+        if input_val not in ob_tree.input_set:
+            raise ValueError(f"Input '{input_val}' is not in the alphabet.")
+
+def insert_all(ob_tree, mode):
+    for inputs, outputs in traces:
+        if mode == "per input":
+            validate_per_input(ob_tree, inputs)
+            ob_tree.insert_observation_unchecked(inputs, outputs)
+        elif mode == "set":
+            ob_tree.insert_observation(inputs, outputs)
+        else:
+            ob_tree.insert_observation_unchecked(inputs, outputs)
+    return ob_tree
+
+def lookup_all(ob_tree, mode):
+    for inputs, _ in traces:
+        if mode == "per input":
+            validate_per_input(ob_tree, inputs)
+            ob_tree.get_observation_unchecked(inputs)
+        elif mode == "set":
+            ob_tree.get_observation(inputs)
+        else:
+            ob_tree.get_observation_unchecked(inputs)
+
+modes = ["per input", "set", "unchecked"]
+total_inputs = number_of_traces * trace_length
+for tree_class in (ObservationTree, CompactObservationTree):
+    # new traces grow the tree, known traces (like most W-method tests) only walk it
+    ob_tree = insert_all(tree_class(input_al), "unchecked")
+    for name, run in [
+        ("insert new traces", lambda mode: insert_all(tree_class(input_al), mode)),
+        ("insert known traces", lambda mode: insert_all(ob_tree, mode)),
+        ("lookup", lambda mode: lookup_all(ob_tree, mode)),
+    ]:
+        times = {mode: min(timeit.repeat(lambda: run(mode), number=1, repeat=repetitions)) for mode in modes}
+        throughput = ", ".join(f"{mode} {total_inputs / times[mode]:,.0f}" for mode in modes)
+        print(f"{tree_class.__name__} {name} (inputs/s): {throughput}, "
+              f"speedup unchecked vs per input {times['per input'] / times['unchecked']:.2f}x")
@@ -3,6 +3,9 @@ from aalpy.utils import load_automaton_from_file
 from aalpy.SULs import MealySUL
 from aalpy.oracles import PerfectKnowledgeEqOracle, StatePrefixEqOracle
 from WMethodEqOracleMealy import WMethodEqOracleMealy
+from HSIMethodEqOracleMealy import HSIMethodEqOracleMealy
+from HybridAdsEqOracleMealy import HybridAdsEqOracleMealy
+from QueryCache import QueryCache, CachedSUL
 import timeit
 import csv, os
 
@@ -11,9 +14,18 @@ learned_automaton = None
 
 fields = ["model", "number_of_states", "number_of_inputs", "complexity", "learning_rounds", "learn_resets", "learn_steps", "test_resets", "test_steps", "extension_rule", "separation_rule", "time", "seed"]
 folder = "Experiment Results"
-result_file = "Experiment2 - W-Method with buffer.csv"
+# conformance oracle: "W" (W-method), "HSI" (Wp-method with harmonized state identifiers) or "HybridADS",
+# each writes its own result file so the oracles can be compared
+oracle = "W"
+oracles = {"W": WMethodEqOracleMealy, "HSI": HSIMethodEqOracleMealy, "HybridADS": HybridAdsEqOracleMealy}
+result_files = {"W": "Experiment2 - W-Method with buffer.csv", "HSI": "Experiment6 - HSI-Method.csv", "HybridADS": "Experiment6 - Hybrid-ADS.csv"}
+result_file = result_files[oracle]
 file_path = os.path.join(folder, result_file)
 
+# Set to a QueryCache to answer repeated queries from disk, across runs and with the other benchmark script,
+# e.g. QueryCache(os.path.join(folder, "query-cache.sqlite")). The learn and test metrics still count every query.
+query_cache = None
+
 
 if not os.path.exists(file_path):
     with open(file_path,mode="w",newline="") as file:
@@ -33,13 +45,17 @@ def benchmark(dot_file, extension_rule, separation_rule, seed):
     input_al = mealy_machine.get_input_alphabet()
 
     sul_mealy = MealySUL(mealy_machine)
+    if query_cache is not None:
+        sul_mealy = CachedSUL(sul_mealy, query_cache, dot_file)
 
     # perfect_oracle = PerfectKnowledgeEqOracle(input_al, sul_mealy, mealy_machine)
-    w_method_oracle = WMethodEqOracleMealy(input_al, sul_mealy, 2, add_to_tree=True)
+    eq_oracle = oracles[oracle](input_al, sul_mealy, 2, add_to_tree=True)
     # state_prefix_oracle = StatePrefixEqOracle(input_al, sul_mealy, 50, 100)
 
-    L_sharp = Lsharp(input_al, sul_mealy, w_method_oracle, extension_rule=extension_rule, separation_rule=separation_rule, seed=seed, max_learning_rounds=75)
+    L_sharp = Lsharp(input_al, sul_mealy, eq_oracle, extension_rule=extension_rule, separation_rule=separation_rule, seed=seed, max_learning_rounds=75)
     learned_automaton, results, learning_rounds = L_sharp.run_Lsharp()
+    if query_cache is not None:
+        sul_mealy.close()
 
 tests = [("Nothing", "SepSeq"), ("SepSeq", "SepSeq"), ("ADS", "SepSeq"), ("Nothing", "ADS"), ("SepSeq", "ADS"), ("ADS", "ADS")]
 
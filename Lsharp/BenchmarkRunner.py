@@ -0,0 +1,200 @@
+from Lsharp import Lsharp
+from aalpy.utils import load_automaton_from_file
+from aalpy.SULs import MealySUL
+from WMethodEqOracleMealy import WMethodEqOracleMealy
+from HSIMethodEqOracleMealy import HSIMethodEqOracleMealy
+from HybridAdsEqOracleMealy import HybridAdsEqOracleMealy
+from QueryCache import QueryCache, CachedSUL
+from multiprocessing import Pool
+import csv, io, os, signal, sys, time
+
+# Parallel version of Benchmark.py: the (model, rule pair, seed) jobs are spread over a pool of processes and every
+# finished job is appended to the result file straight away. Jobs already in the result file are skipped, so an
+# interrupted sweep continues where it stopped when the script is started again.
+fields = ["model", "number_of_states", "number_of_inputs", "complexity", "learning_rounds", "learn_resets", "learn_steps", "test_resets", "test_steps", "extension_rule", "separation_rule", "time", "seed", "tree_size"]
+timeout_fields = ["model", "extension_rule", "separation_rule", "seed", "timeout"]
+folder = "Experiment Results"
+# conformance oracle: "W" (W-method), "HSI" (Wp-method with harmonized state identifiers) or "HybridADS",
+# each writes its own result file so the oracles can be compared
+oracle = "W"
+oracles = {"W": WMethodEqOracleMealy, "HSI": HSIMethodEqOracleMealy, "HybridADS": HybridAdsEqOracleMealy}
+result_files = {"W": "Experiment2 - W-Method with buffer.csv", "HSI": "Experiment6 - HSI-Method.csv", "HybridADS": "Experiment6 - Hybrid-ADS.csv"}
+result_file = result_files[oracle]
+file_path = os.path.join(folder, result_file)
+# jobs that ran into the timeout are listed here and skipped on a restart as well, delete the file to retry them
+timeout_file_path = os.path.join(folder, os.path.splitext(result_file)[0] + " - timeouts.csv")
+
+processes = os.cpu_count()
+# seconds after which a single learning run is aborted, None to let every run finish (needs SIGALRM, so not on Windows)
+timeout = 600
+compact_tree = False
+# SQLite file of a QueryCache shared by all workers, e.g. os.path.join(folder, "query-cache.sqlite"), None to disable
+query_cache_file = None
+
+tests = [("Nothing", "SepSeq"), ("SepSeq", "SepSeq"), ("ADS", "SepSeq"), ("Nothing", "ADS"), ("SepSeq", "ADS"), ("ADS", "ADS")]
+
+all_models = ["ASN_learnresult_SecureCode Aut_fix", "1_learnresult_MasterCard_fix", "LoesTarget", "Rabo_learnresult_SecureCode_Aut_fix",
+            "Rabo_learnresult_MAESTRO_fix", "ASN_learnresult_MAESTRO_fix", "4_learnresult_MAESTRO_fix", "10_learnresult_MasterCard_fix",
+            "Volksbank_learnresult_MAESTRO_fix", "learnresult_fix", "TCP_FreeBSD_Client", "TCP_Windows8_Client", "TCP_Linux_Client",
+            "DropBear", "OpenSSH", "TCP_Windows8_Server", "TCP_FreeBSD_Server", "TCP_Linux_Server", "BitVise",
+            "OpenSSL_1.0.2_client_regular", "OpenSSL_1.0.1j_client_regular", "RSA_BSAFE_Java_6.1.1_server_regular",
+            "miTLS_0.1.3_server_regular", "OpenSSL_1.0.2_server_regular", "NSS_3.17.4_client_regular", "GnuTLS_3.3.12_server_regular",
+            "GnuTLS_3.3.12_client_regular", "NSS_3.17.4_server_regular", "OpenSSL_1.0.1l_server_regular", "OpenSSL_1.0.1g_client_regular",
+            "RSA_BSAFE_C_4.0.4_server_regular", "OpenSSL_1.0.1j_server_regular", "GnuTLS_3.3.8_client_regular", "OpenSSL_1.0.2_client_full",
+            "GnuTLS_3.3.8_server_regular", "GnuTLS_3.3.12_server_full", "GnuTLS_3.3.12_client_full", "OpenSSL_1.0.1g_server_regular",
+            "NSS_3.17.4_client_full", "GnuTLS_3.3.8_server_full", "GnuTLS_3.3.8_client_full"]
+
+seeds = [
+    81, 100, 158, 216, 245, 359, 366, 470, 560, 578, 580, 597, 661, 689, 692, 783, 818, 879, 930, 968,
+    995, 1004, 1005, 1190, 1205, 1257, 1320, 1534, 1541, 1596, 1607, 1665, 1836, 1989, 2015, 2143, 2147, 2199, 2221, 2263,
+    2283, 2365, 2370, 2408, 2495, 2528, 2554, 2558, 2561, 2588, 2610, 2619, 2679, 2773, 2816, 2950, 2966, 2969, 2983, 3044,
+    3101, 3131, 3147, 3169, 3209, 3211, 3213, 3235, 3265, 3350, 3383, 3415, 3444, 3496, 3528, 3588, 3658, 3743, 3769, 3806,
+    3809, 3900, 3980, 4094, 4179, 4358, 4370, 4447, 4467, 4535, 4550, 4588, 4632, 4646, 4689, 4782, 4845, 4948, 5102, 5409]
+
+# SIGALRM only exists on Unix, elsewhere every run is left to finish
+use_timeout = timeout is not None and hasattr(signal, "SIGALRM")
+
+# per worker process: the models parsed so far and the connection to the query cache
+models = {}
+query_cache = None
+
+class JobTimeout(Exception):
+    pass
+
+def _raise_timeout(signum, frame):
+    raise JobTimeout()
+
+def init_worker():
+    """
+    Runs once in every worker process. Ctrl+C is left to the main process, which stops the pool.
+    """
+    global query_cache
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if use_timeout:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+    if query_cache_file is not None:
+        query_cache = QueryCache(query_cache_file)
+
+def get_model(dot_file):
+    """
+    Returns the Mealy machine of a model, every dot file is parsed once per worker
+    """
+    if dot_file not in models:
+        models[dot_file] = load_automaton_from_file(f'Lsharp/DotFiles/{dot_file}.dot', automaton_type='mealy')
+    return models[dot_file]
+
+def run_job(job):
+    """
+    Learns one model with one rule pair and seed. Returns the result row, or None when the run timed out.
+    The time covers the learning run only, not the parsing of the model.
+    """
+    dot_file, extension_rule, separation_rule, seed = job
+    mealy_machine = get_model(dot_file)
+    input_al = mealy_machine.get_input_alphabet()
+
+    if use_timeout:
+        signal.alarm(timeout)
+    try:
+        start = time.perf_counter()
+        sul_mealy = MealySUL(mealy_machine)
+        if query_cache is not None:
+            sul_mealy = CachedSUL(sul_mealy, query_cache, f'Lsharp/DotFiles/{dot_file}.dot')
+        eq_oracle = oracles[oracle](input_al, sul_mealy, 2, add_to_tree=True)
+        L_sharp = Lsharp(input_al, sul_mealy, eq_oracle, extension_rule=extension_rule, separation_rule=separation_rule,
+                         seed=seed, max_learning_rounds=75, compact_tree=compact_tree)
+        learned_automaton, results, learning_rounds = L_sharp.run_Lsharp()
+        execution_time = time.perf_counter() - start
+        if query_cache is not None:
+            sul_mealy.close()
+    except JobTimeout:
+        return job, None
+    finally:
+        if use_timeout:
+            signal.alarm(0)
+
+    return job, {"model": dot_file,
+                 "number_of_states": len(mealy_machine.states),
+                 "number_of_inputs": len(input_al),
+                 "complexity": len(input_al) * len(mealy_machine.states),
+                 "learning_rounds": learning_rounds,
+                 "learn_resets": results[0],
+                 "learn_steps": results[1],
+                 "test_resets": results[2],
+                 "test_steps": results[3],
+                 "extension_rule": extension_rule,
+                 "separation_rule": separation_rule,
+                 "time": execution_time,
+                 "seed": seed,
+                 "tree_size": results[4]
+    }
+
+def open_result_file(path, fieldnames):
+    """
+    Opens a result file for appending and returns it with the jobs it already contains.
+    A row cut off by an interrupted write is removed first, a new file gets the header.
+    """
+    finished = set()
+    if os.path.exists(path):
+        with open(path, mode="rb+") as file:
+            data = file.read()
+            if data and not data.endswith(b"\n"):
+                file.truncate(data.rfind(b"\n") + 1)
+        with open(path, mode="r", newline="") as file:
+            for row in csv.DictReader(file):
+                finished.add((row["model"], row["extension_rule"], row["separation_rule"], int(row["seed"])))
+
+    file = open(path, mode="a", newline="")
+    if file.tell() == 0:
+        write_row(file, fieldnames, None)
+    return file, finished
+
+def write_row(file, fieldnames, row):
+    """
+    Appends one row (the header when row is None) with a single write and syncs it to disk,
+    so an interruption leaves either the complete row or a cut off line that open_result_file removes
+    """
+    line = io.StringIO()
+    writer = csv.DictWriter(line, fieldnames=fieldnames)
+    if row is None:
+        writer.writeheader()
+    else:
+        writer.writerow(row)
+    file.write(line.getvalue())
+    file.flush()
+    os.fsync(file.fileno())
+
+if __name__ == "__main__":
+    if timeout is not None and not use_timeout:
+        print("Timeouts need SIGALRM, which this platform does not have, all runs are left to finish.")
+
+    result_output, finished = open_result_file(file_path, fields)
+    timeout_output, timed_out = open_result_file(timeout_file_path, timeout_fields)
+    skipped = finished | timed_out
+    jobs = [(dot_file, extension_rule, separation_rule, seed)
+            for dot_file in all_models
+            for (extension_rule, separation_rule) in tests
+            for seed in seeds
+            if (dot_file, extension_rule, separation_rule, seed) not in skipped]
+    print(f"{len(finished)} jobs finished, {len(timed_out)} timed out, {len(jobs)} to run on {processes} processes")
+
+    pool = Pool(processes, initializer=init_worker)
+    try:
+        for done, (job, row) in enumerate(pool.imap_unordered(run_job, jobs), 1):
+            if row is None:
+                dot_file, extension_rule, separation_rule, seed = job
+                write_row(timeout_output, timeout_fields, {"model": dot_file, "extension_rule": extension_rule,
+                                                           "separation_rule": separation_rule, "seed": seed, "timeout": timeout})
+                print(f"Timed out after {timeout}s: {job}")
+            else:
+                write_row(result_output, fields, row)
+            if done % 100 == 0 or done == len(jobs):
+                print(f"{done}/{len(jobs)} jobs done")
+        pool.close()
+    except KeyboardInterrupt:
+        print("Interrupted, the finished jobs are saved and skipped on the next start")
+        pool.terminate()
+        sys.exit(1)
+    finally:
+        pool.join()
+        result_output.close()
+        timeout_output.close()
@@ -0,0 +1,226 @@
+import gc
+import os
+import pickle
+import struct
+from array import array
+
+from CompactObservationTree import CompactObservationTree
+
+class Checkpoint:
+    """
+    Append-only binary log of a learning run, from which the run can be resumed or warm-started.
+    At the end of every learning round the observations that extended the tree since the previous round are appended,
+    followed by the new witnesses and the basis and frontier state. Nodes are referred to by their creation order,
+    which replaying the log in order reproduces, and inputs and outputs by symbol codes defined in the log itself.
+    Records:
+        S: symbol definition (pickled value, gets the next symbol code)
+        O: observation, the branch node followed by the inputs and outputs of the new nodes below it
+        W: witnesses, pairs of nodes with the input codes of their witness
+        R: end of a learning round, the round number, results, basis and frontier to basis candidates
+    """
+    _magic = b"LSHARPCK1\n"
+    _length = struct.Struct("<I")
+    _observation = struct.Struct("<iI")
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.symbols = {}
+        self.written_witnesses = set()
+
+    def start(self, learner):
+        """
+        Starts a new log for a learner with an empty tree, its observations are recorded from now on
+        """
+        if learner.ob_tree.get_size() != 1:
+            raise ValueError("A checkpoint log has to start from an empty observation tree.")
+        self.file = open(self.path, "wb")
+        self.file.write(self._magic)
+        self.file.flush()
+        self.symbols = {}
+        self.written_witnesses = set()
+        learner.ob_tree.pending_observations = []
+
+    def save(self, learner, learning_round):
+        """
+        Appends the new observations, the new witnesses and the basis and frontier state of the learner, and flushes
+        the log to disk
+        """
+        ob_tree = learner.ob_tree
+        root_id = ob_tree.root.id
+        buffer = bytearray()
+
+        pending, ob_tree.pending_observations = ob_tree.pending_observations, []
+        for last_node, num_new_nodes in pending:
+            inputs = []
+            outputs = []
+            node = last_node
+            for _ in range(num_new_nodes):
+                input_val = node.input_to_parent
+                node = node.parent
+                inputs.append(self._symbol(input_val, buffer))
+                outputs.append(self._symbol(node.get_output(input_val), buffer))
+            inputs.reverse()
+            outputs.reverse()
+            buffer += b"O" + self._observation.pack(node.id - root_id, num_new_nodes)
+            buffer += array("i", inputs + outputs).tobytes()
+
+        witnesses = []
+        for key, witness in learner.witness_cache.witnesses.items():
+            if key not in self.written_witnesses:
+                self.written_witnesses.add(key)
+                witnesses.append((key[0] - root_id, key[1] - root_id, [self._symbol(input_val, buffer) for input_val in witness]))
+        if witnesses:
+            self._write_pickle(b"W", witnesses, buffer)
+
+        state = {
+            "round": learning_round,
+            "results": list(learner.results),
+            "basis": [basis_state.id - root_id for basis_state in learner.basis],
+            "frontier": [
+                (frontier_state.id - root_id, [basis_state.id - root_id for basis_state in learner.basis.get_states(candidates)])
+                for frontier_state, candidates in learner.frontier_to_basis_dict.items()
+            ],
+        }
+        self._write_pickle(b"R", state, buffer)
+
+        self.file.write(buffer)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def resume(self, learner):
+        """
+        Restores the tree, basis, frontier, witnesses and results of the last saved round into a new learner and
+        continues the log. Returns the number of the last saved learning round.
+        """
+        if learner.ob_tree.get_size() != 1:
+            raise ValueError("A checkpoint can only be restored into an empty observation tree.")
+        nodes = [learner.ob_tree.root]
+        witnesses = []
+        state = None
+        symbols = []
+        for tag, record in self._read_records(symbols):
+            if tag == b"O":
+                branch, inputs, outputs = record
+                nodes.extend(learner.ob_tree.append_path(nodes[branch], inputs, outputs))
+            elif tag == b"W":
+                witnesses.extend(record)
+            elif tag == b"R":
+                state = record
+        valid_length = self.valid_length
+
+        for first, second, witness in witnesses:
+            learner.witness_cache.add(nodes[first], nodes[second], tuple(symbols[code] for code in witness))
+
+        learning_round = 0
+        if state is not None:
+            learning_round = state["round"]
+            learner.results = list(state["results"])
+            # the basis is added in its saved order, so it gets the same indices in the candidate masks
+            for order in state["basis"]:
+                learner.basis.add(nodes[order])
+            for frontier, basis_list in state["frontier"]:
+                learner.frontier_to_basis_dict[nodes[frontier]] = learner.basis.get_mask(nodes[order] for order in basis_list)
+
+        # a record cut off by a crash is dropped, the log continues after the last complete record
+        self.file = open(self.path, "r+b")
+        self.file.truncate(valid_length)
+        self.file.seek(valid_length)
+        self.symbols = {value: code for code, value in enumerate(symbols)}
+        self.written_witnesses = {
+            (nodes[first].id, nodes[second].id) if nodes[first].id <= nodes[second].id else (nodes[second].id, nodes[first].id)
+            for first, second, _ in witnesses
+        }
+        learner.ob_tree.pending_observations = []
+        return learning_round
+
+    def read_maximal_sequences(self, alphabet):
+        """
+        Yields the input sequences of all leaves of the logged tree, which together cover all its observations.
+        The log is replayed into a separate CompactObservationTree, which leaves the node numbering of the
+        learner's own tree untouched.
+        """
+        ob_tree = CompactObservationTree(alphabet)
+        nodes = [ob_tree.root]
+        for tag, record in self._read_records([]):
+            if tag == b"O":
+                branch, inputs, outputs = record
+                nodes.extend(ob_tree.append_path(nodes[branch], inputs, outputs))
+
+        for node in nodes:
+            if all(node.get_successor(input_val) is None for input_val in ob_tree.input_values):
+                yield ob_tree.get_transfer_sequence(ob_tree.root, node)
+
+    def _read_records(self, symbols):
+        """
+        Streams the complete records of the log, decoding symbols into the given list.
+        Stops at the end of the file or at a record that was cut off, self.valid_length is the end of the last
+        complete record. The garbage collector is paused meanwhile, as it would otherwise rescan the growing tree
+        over and over while millions of nodes are created.
+        """
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            yield from self._read_file(symbols)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _read_file(self, symbols):
+        with open(self.path, "rb") as file:
+            if file.read(len(self._magic)) != self._magic:
+                raise ValueError(f"{self.path} is not a learning checkpoint")
+            self.valid_length = file.tell()
+            while True:
+                tag = file.read(1)
+                if tag == b"O":
+                    header = file.read(self._observation.size)
+                    if len(header) < self._observation.size:
+                        return
+                    branch, length = self._observation.unpack(header)
+                    data = file.read(8 * length)
+                    if len(data) < 8 * length:
+                        return
+                    codes = array("i")
+                    codes.frombytes(data)
+                    record = (branch, [symbols[code] for code in codes[:length]], [symbols[code] for code in codes[length:]])
+                elif tag in (b"S", b"W", b"R"):
+                    header = file.read(self._length.size)
+                    if len(header) < self._length.size:
+                        return
+                    length = self._length.unpack(header)[0]
+                    data = file.read(length)
+                    if len(data) < length:
+                        return
+                    record = pickle.loads(data)
+                    if tag == b"S":
+                        symbols.append(record)
+                        self.valid_length = file.tell()
+                        continue
+                else:
+                    return
+                self.valid_length = file.tell()
+                yield tag, record
+
+    def _symbol(self, value, buffer):
+        """
+        Returns the code of a symbol, appending its definition to the buffer when it is new
+        """
+        code = self.symbols.get(value)
+        if code is None:
+            code = len(self.symbols)
+            self.symbols[value] = code
+            self._write_pickle(b"S", value, buffer)
+        return code
+
+    def _write_pickle(self, tag, value, buffer):
+        data = pickle.dumps(value)
+        buffer += tag + self._length.pack(len(data)) + data
+
+    def close(self):
+        """
+        Closes the log file
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,312 @@
+from array import array
+
+class CompactNode:
+    """
+    Lightweight handle to a node of the CompactObservationTree, offering the same interface as ObservationTree.Node
+    """
+    __slots__ = ['tree', 'id']
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.id = index
+
+    def __hash__(self):
+        # ObservationTree numbers its nodes from 1, hashing alike keeps set iteration orders (and runs) identical
+        return self.id + 1
+
+    def __eq__(self, other):
+        if isinstance(other, CompactNode):
+            return self.id == other.id and self.tree is other.tree
+        return NotImplemented
+
+    def __repr__(self):
+        return f"CompactNode({self.id})"
+
+    @property
+    def parent(self):
+        """ Returns the parent node, or None for the root """
+        parent = self.tree.parents[self.id]
+        if parent < 0:
+            return None
+        return CompactNode(self.tree, parent)
+
+    @property
+    def input_to_parent(self):
+        """ Returns the input leading from the parent to this node """
+        if self.id == 0:
+            return None
+        return self.tree.input_values[self.tree.inputs_to_parent[self.id]]
+
+    @property
+    def version(self):
+        """ Returns the tree version at which the subtree of this node last grew """
+        return self.tree.versions[self.id]
+
+    @property
+    def depth(self):
+        """ Returns the distance from the root """
+        return self.tree.depths[self.id]
+
+    def get_access_sequence(self):
+        """ Returns the inputs leading from the root to this node, computed once and kept as a tuple """
+        return self.tree._get_access_sequence(self.id)
+
+    def get_successor(self, input_val):
+        """ Returns the successor node for the given input """
+        tree = self.tree
+        successor = tree.successors[self.id * tree.alphabet_size + tree.input_index[input_val]]
+        if successor < 0:
+            return None
+        return CompactNode(tree, successor)
+
+    def get_output(self, input_val):
+        """ Returns the output for the given input """
+        tree = self.tree
+        successor = tree.successors[self.id * tree.alphabet_size + tree.input_index[input_val]]
+        if successor < 0:
+            return None
+        return tree.output_values[tree.outputs[successor]]
+
+
+class CompactObservationTree:
+    """
+    Observation tree that stores its nodes in flat integer arrays instead of one object per node.
+    Inputs and outputs are interned to small integers, the successor of node n for input i is stored at
+    successors[n * |alphabet| + i] (-1 when unknown) and the output of the transition into node n at outputs[n].
+    The API matches ObservationTree, so the learner can use either backend.
+    """
+    def __init__(self, alphabet):
+        """
+        Initialize the tree with a root node and the alphabet
+        """
+        # the inputs in the given order, every search over the inputs follows it so runs do not depend on the hash seed
+        self.alphabet = list(dict.fromkeys(alphabet))
+        self.input_set = set(self.alphabet)
+        self.input_values = list(dict.fromkeys(alphabet))
+        self.input_index = {input_val: index for index, input_val in enumerate(self.input_values)}
+        self.alphabet_size = len(self.input_values)
+        self.output_values = []
+        self.output_index = {}
+        self.version = 0
+        # (last node, number of new nodes) of every extending insert, recorded for a checkpoint when set to a list
+        self.pending_observations = None
+
+        self._empty_row = array('i', [-1]) * self.alphabet_size
+        self.successors = array('i')
+        self.outputs = array('i')
+        self.parents = array('i')
+        self.inputs_to_parent = array('i')
+        self.versions = array('i')
+        self.depths = array('i')
+        self.access_sequences = {0: ()}
+
+        self._add_node(-1, -1, -1)
+        self.root = CompactNode(self, 0)
+
+    def get_size(self):
+        """
+        Returns the number of nodes in the tree
+        """
+        return len(self.parents)
+
+    def _add_node(self, parent, input_code, output_code):
+        """
+        Appends a new node to the arrays and returns its index
+        """
+        index = len(self.parents)
+        self.parents.append(parent)
+        self.inputs_to_parent.append(input_code)
+        self.outputs.append(output_code)
+        self.versions.append(0)
+        self.depths.append(self.depths[parent] + 1 if parent >= 0 else 0)
+        self.successors.extend(self._empty_row)
+        return index
+
+    def _intern_output(self, output_val):
+        """
+        Returns the integer code of an output, assigning a new one if needed
+        """
+        code = self.output_index.get(output_val)
+        if code is None:
+            code = len(self.output_values)
+            self.output_index[output_val] = code
+            self.output_values.append(output_val)
+        return code
+
+    def _validate_input(self, inputs):
+        """
+        Check if all inputs are valid (part of the alphabet)
+        """
+        if not self.input_set.issuperset(inputs):
+            input_val = next(input_val for input_val in inputs if input_val not in self.input_set)
+            raise ValueError(f"Input '{input_val}' is not in the alphabet.")
+
+    def insert_observation(self, inputs, outputs):
+        """
+        Insert an observation into the tree using sequences of inputs and outputs
+        """
+        if len(inputs) != len(outputs):
+            raise ValueError("Inputs and outputs must have the same length.")
+
+        self._validate_input(inputs)
+        self.insert_observation_unchecked(inputs, outputs)
+
+    def insert_observation_unchecked(self, inputs, outputs):
+        """
+        Insert an observation without validating it, for trusted callers whose inputs come from the alphabet or the
+        tree itself and whose outputs match the inputs one to one
+        """
+        successors = self.successors
+        tree_outputs = self.outputs
+        input_index = self.input_index
+        output_index = self.output_index
+        alphabet_size = self.alphabet_size
+        size_before = len(self.parents)
+        node = 0
+        for input_val, output_val in zip(inputs, outputs):
+            input_code = input_index[input_val]
+            slot = node * alphabet_size + input_code
+            successor = successors[slot]
+            if successor < 0:
+                successor = self._add_node(node, input_code, self._intern_output(output_val))
+                successors[slot] = successor
+            elif tree_outputs[successor] != output_index.get(output_val, -1):
+                out = self.output_values[tree_outputs[successor]]
+                raise Exception(f"observation not consistent with tree with output from tree: {out} and output from call: {output_val}")
+            node = successor
+
+        if len(self.parents) != size_before:
+            self._mark_extended(node)
+            if self.pending_observations is not None:
+                self.pending_observations.append((CompactNode(self, node), len(self.parents) - size_before))
+
+    def append_path(self, node, inputs, outputs):
+        """
+        Appends a chain of new nodes for the inputs and outputs below the given node, which must not have a successor
+        for the first input yet (used to replay a checkpoint). The arrays are extended in bulk. Returns the new nodes.
+        """
+        if not inputs:
+            return []
+        alphabet_size = self.alphabet_size
+        input_codes = [self.input_index[input_val] for input_val in inputs]
+        start = len(self.parents)
+        if self.successors[node.id * alphabet_size + input_codes[0]] >= 0:
+            raise ValueError("The path to append already exists in the tree.")
+
+        length = len(input_codes)
+        depth = self.depths[node.id]
+        self.parents.append(node.id)
+        self.parents.extend(range(start, start + length - 1))
+        self.inputs_to_parent.extend(input_codes)
+        self.outputs.extend([self._intern_output(output_val) for output_val in outputs])
+        self.versions.extend(array('i', [0]) * length)
+        self.depths.extend(range(depth + 1, depth + 1 + length))
+        self.successors.extend(self._empty_row * length)
+
+        successors = self.successors
+        successors[node.id * alphabet_size + input_codes[0]] = start
+        for index in range(1, length):
+            successors[(start + index - 1) * alphabet_size + input_codes[index]] = start + index
+
+        self._mark_extended(start + length - 1)
+        return [CompactNode(self, index) for index in range(start, start + length)]
+
+    def _mark_extended(self, node):
+        """
+        Stamps the node and all its ancestors with a new tree version, as their subtrees have grown
+        """
+        self.version += 1
+        while node >= 0:
+            self.versions[node] = self.version
+            node = self.parents[node]
+
+    def _get_node_index(self, inputs):
+        """
+        Returns the index of the node reached by the inputs, or -1 if the inputs leave the tree
+        """
+        successors = self.successors
+        alphabet_size = self.alphabet_size
+        node = 0
+        for input_val in inputs:
+            node = successors[node * alphabet_size + self.input_index[input_val]]
+            if node < 0:
+                return -1
+        return node
+
+    def get_observation(self, inputs):
+        """
+        Retrieve the list of outputs based on a given sequence of inputs
+        """
+        self._validate_input(inputs)
+        return self.get_observation_unchecked(inputs)
+
+    def get_observation_unchecked(self, inputs):
+        """
+        Retrieve the list of outputs without validating the inputs, for trusted callers
+        """
+        successors = self.successors
+        alphabet_size = self.alphabet_size
+        node = 0
+        observation = []
+        for input_val in inputs:
+            node = successors[node * alphabet_size + self.input_index[input_val]]
+            if node < 0:
+                return None
+            observation.append(self.output_values[self.outputs[node]])
+
+        return observation
+
+    def get_successor(self, inputs):
+        """
+        Retrieve the node (sub-tree) corresponding to the given sequence of inputs
+        """
+        self._validate_input(inputs)
+        return self.get_successor_unchecked(inputs)
+
+    def get_successor_unchecked(self, inputs):
+        """
+        Retrieve the node corresponding to the inputs without validating them, for trusted callers
+        """
+        node = self._get_node_index(inputs)
+        if node < 0:
+            return None
+        return CompactNode(self, node)
+
+    def _get_access_sequence(self, node):
+        """
+        Returns the access sequence of the node with the given index, caching it for later calls
+        """
+        access_sequence = self.access_sequences.get(node)
+        if access_sequence is None:
+            inputs = []
+            current_node = node
+            while current_node not in self.access_sequences:
+                inputs.append(self.input_values[self.inputs_to_parent[current_node]])
+                current_node = self.parents[current_node]
+            inputs.reverse()
+            access_sequence = self.access_sequences[current_node] + tuple(inputs)
+            self.access_sequences[node] = access_sequence
+        return access_sequence
+
+    def get_transfer_sequence(self, from_node, to_node):
+        """
+        Get the transfer sequence (tuple of inputs) that moves from one node to another.
+        From the root this is the cached access sequence of the node, otherwise only the depth difference is walked.
+        """
+        if from_node.id == 0:
+            return self._get_access_sequence(to_node.id)
+
+        depth_difference = self.depths[to_node.id] - self.depths[from_node.id]
+        if depth_difference < 0:
+            return None
+
+        transfer_sequence = []
+        current_node = to_node.id
+        for _ in range(depth_difference):
+            transfer_sequence.append(self.input_values[self.inputs_to_parent[current_node]])
+            current_node = self.parents[current_node]
+
+        if current_node != from_node.id:
+            return None
+        transfer_sequence.reverse()
+        return tuple(transfer_sequence)
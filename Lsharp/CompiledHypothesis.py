@@ -0,0 +1,226 @@
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class CompiledHypothesis:
+    """
+    Mealy machine hypothesis compiled to integer state ids and dense transition and output tables:
+    the successor and output of state s for input i are stored at index s * |alphabet| + i.
+    Used for fast simulation next to the MealyMachine handed out by the learner, and patched along with it when
+    the learner adds states or redirects transitions.
+    """
+    def __init__(self, hypothesis, alphabet):
+        self.states = list(hypothesis.states)
+        self.state_index = {state: index for index, state in enumerate(self.states)}
+        self.initial_state = self.state_index[hypothesis.initial_state]
+        self.input_values = list(dict.fromkeys(alphabet))
+        self.input_index = {input_val: index for index, input_val in enumerate(self.input_values)}
+        self.alphabet_size = len(self.input_values)
+        self.output_values = []
+        self.output_index = {}
+
+        self.transitions = []
+        self.outputs = []
+        for state in self.states:
+            for input_val in self.input_values:
+                self.transitions.append(self.state_index[state.transitions[input_val]])
+                self.outputs.append(self._intern_output(state.output_fun[input_val]))
+
+        self._tables = None
+        self._partition_levels = None
+
+    def _intern_output(self, output_val):
+        """
+        Returns the integer code of an output, assigning a new one if needed
+        """
+        code = self.output_index.get(output_val)
+        if code is None:
+            code = len(self.output_values)
+            self.output_index[output_val] = code
+            self.output_values.append(output_val)
+        return code
+
+    def add_state(self, state):
+        """
+        Adds a hypothesis state whose transitions are still to be set with set_transition, returns its state id
+        """
+        index = len(self.states)
+        self.states.append(state)
+        self.state_index[state] = index
+        self.transitions.extend([-1] * self.alphabet_size)
+        self.outputs.extend([-1] * self.alphabet_size)
+        self._tables = None
+        self._partition_levels = None
+        return index
+
+    def set_transition(self, state, input_val, successor, output_val):
+        """
+        Sets the successor state id and the output of a state id for an input
+        """
+        slot = state * self.alphabet_size + self.input_index[input_val]
+        self.transitions[slot] = successor
+        self.outputs[slot] = self._intern_output(output_val)
+        self._tables = None
+        self._partition_levels = None
+
+    def get_output(self, state, input_val):
+        """
+        Returns the output of the state for the given input
+        """
+        return self.output_values[self.outputs[state * self.alphabet_size + self.input_index[input_val]]]
+
+    def get_successor(self, state, input_val):
+        """
+        Returns the successor state id for the given input
+        """
+        return self.transitions[state * self.alphabet_size + self.input_index[input_val]]
+
+    def get_state(self, inputs, state=None):
+        """
+        Returns the state id reached by the inputs from the given state (default the initial state)
+        """
+        state = self.initial_state if state is None else state
+        transitions = self.transitions
+        alphabet_size = self.alphabet_size
+        input_index = self.input_index
+        for input_val in inputs:
+            state = transitions[state * alphabet_size + input_index[input_val]]
+        return state
+
+    def get_states(self, inputs, state=None):
+        """
+        Returns the state ids visited by the inputs from the given state (default the initial state), including that state
+        """
+        state = self.initial_state if state is None else state
+        transitions = self.transitions
+        alphabet_size = self.alphabet_size
+        input_index = self.input_index
+        states = [state]
+        for input_val in inputs:
+            state = transitions[state * alphabet_size + input_index[input_val]]
+            states.append(state)
+        return states
+
+    def get_access_sequences(self):
+        """
+        Returns for every state id a shortest input sequence reaching it from the initial state (breadth-first, inputs
+        in alphabet order)
+        """
+        access_sequences = [None] * len(self.states)
+        access_sequences[self.initial_state] = ()
+        queue = deque([self.initial_state])
+        while queue:
+            state = queue.popleft()
+            for input_code, input_val in enumerate(self.input_values):
+                successor = self.transitions[state * self.alphabet_size + input_code]
+                if access_sequences[successor] is None:
+                    access_sequences[successor] = access_sequences[state] + (input_val,)
+                    queue.append(successor)
+        return access_sequences
+
+    def get_partition_levels(self):
+        """
+        Partition refinement (Moore's algorithm) of the states: level 0 groups the states by their outputs, level i + 1
+        also by the level i blocks of their successors, until the partition is stable. Returns per level the block
+        number of every state id, two states are first separated at level i by a sequence of length i + 1.
+        """
+        if self._partition_levels is None:
+            num_states = len(self.states)
+            alphabet_size = self.alphabet_size
+            signatures = {}
+            blocks = [
+                signatures.setdefault(tuple(self.outputs[state * alphabet_size:(state + 1) * alphabet_size]), len(signatures))
+                for state in range(num_states)
+            ]
+            levels = [blocks]
+            while True:
+                num_blocks = len(signatures)
+                signatures = {}
+                new_blocks = [
+                    signatures.setdefault(
+                        (blocks[state],) + tuple(blocks[successor] for successor in self.transitions[state * alphabet_size:(state + 1) * alphabet_size]),
+                        len(signatures)
+                    )
+                    for state in range(num_states)
+                ]
+                if len(signatures) == num_blocks:
+                    break
+                blocks = new_blocks
+                levels.append(blocks)
+            self._partition_levels = levels
+        return self._partition_levels
+
+    def find_separating_sequence(self, state_one, state_two):
+        """
+        Returns a shortest input sequence on which the two state ids give different outputs, or None if they are
+        equivalent, read from the partition levels: where two states are first separated at level i, one input
+        leads to successors that are separated at a lower level
+        """
+        levels = self.get_partition_levels()
+        transitions = self.transitions
+        outputs = self.outputs
+        alphabet_size = self.alphabet_size
+        sequence = []
+        while True:
+            level = next((level for level, blocks in enumerate(levels) if blocks[state_one] != blocks[state_two]), None)
+            if level is None:
+                return None
+            for input_code in range(alphabet_size):
+                first_slot = state_one * alphabet_size + input_code
+                second_slot = state_two * alphabet_size + input_code
+                if level == 0:
+                    if outputs[first_slot] != outputs[second_slot]:
+                        sequence.append(self.input_values[input_code])
+                        return tuple(sequence)
+                elif levels[level - 1][transitions[first_slot]] != levels[level - 1][transitions[second_slot]]:
+                    sequence.append(self.input_values[input_code])
+                    state_one, state_two = transitions[first_slot], transitions[second_slot]
+                    break
+
+    def compute_outputs(self, inputs, state=None):
+        """
+        Returns the outputs of the hypothesis for the inputs from the given state (default the initial state)
+        """
+        state = self.initial_state if state is None else state
+        transitions = self.transitions
+        outputs = self.outputs
+        alphabet_size = self.alphabet_size
+        input_index = self.input_index
+        output_values = self.output_values
+        result = []
+        for input_val in inputs:
+            slot = state * alphabet_size + input_index[input_val]
+            result.append(output_values[outputs[slot]])
+            state = transitions[slot]
+        return result
+
+    def simulate_batch(self, input_sequences):
+        """
+        Returns the outputs for a batch of input sequences from the initial state. With NumPy the sequences are padded
+        to a matrix and simulated all at once, one vectorized table lookup per position.
+        """
+        if np is None or not input_sequences:
+            return [self.compute_outputs(inputs) for inputs in input_sequences]
+
+        if self._tables is None:
+            self._tables = (np.array(self.transitions, dtype=np.int32), np.array(self.outputs, dtype=np.int32))
+        transitions, outputs = self._tables
+
+        lengths = [len(inputs) for inputs in input_sequences]
+        input_codes = np.zeros((len(input_sequences), max(lengths)), dtype=np.int32)
+        input_index = self.input_index
+        for row, inputs in enumerate(input_sequences):
+            input_codes[row, :len(inputs)] = [input_index[input_val] for input_val in inputs]
+
+        states = np.full(len(input_sequences), self.initial_state, dtype=np.int32)
+        output_codes = np.empty(input_codes.shape, dtype=np.int32)
+        for position in range(input_codes.shape[1]):
+            slots = states * self.alphabet_size + input_codes[:, position]
+            output_codes[:, position] = outputs[slots]
+            states = transitions[slots]
+
+        output_values = self.output_values
+        return [[output_values[code] for code in row[:length]] for row, length in zip(output_codes.tolist(), lengths)]
@@ -0,0 +1,31 @@
+class FrontierCandidates(dict):
+    """
+    Dictionary of the frontier states to the bitmask of their basis candidates that keeps the frontier states without
+    a candidate (isolated) and with more than one (ambiguous) up to date on every assignment, so the learner can check
+    for them in constant time instead of scanning the whole frontier. Both are dicts used as ordered sets.
+    """
+    def __init__(self):
+        super().__init__()
+        self.isolated = {}
+        self.ambiguous = {}
+
+    def __setitem__(self, frontier_state, candidates):
+        super().__setitem__(frontier_state, candidates)
+        if candidates:
+            self.isolated.pop(frontier_state, None)
+        else:
+            self.isolated[frontier_state] = None
+        if candidates & (candidates - 1):
+            self.ambiguous[frontier_state] = None
+        else:
+            self.ambiguous.pop(frontier_state, None)
+
+    def __delitem__(self, frontier_state):
+        super().__delitem__(frontier_state)
+        self.isolated.pop(frontier_state, None)
+        self.ambiguous.pop(frontier_state, None)
+
+    def pop(self, frontier_state, *default):
+        self.isolated.pop(frontier_state, None)
+        self.ambiguous.pop(frontier_state, None)
+        return super().pop(frontier_state, *default)
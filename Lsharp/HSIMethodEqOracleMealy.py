@@ -0,0 +1,106 @@
+from IndexPermutation import IndexPermutation
+from Apartness import Apartness
+from WMethodEqOracleMealy import WMethodEqOracleMealy
+
+
+class HSIMethodEqOracleMealy(WMethodEqOracleMealy):
+    """
+    Equivalence oracle based on harmonized state identifiers, the HSI variant of the Wp-method. From 'Gang Luo,
+    Alexandre Petrenko, Gregor von Bochmann. Selecting test sequences for partially-specified nondeterministic finite
+    state machines'. Instead of appending the whole characterization set after every prefix, a test only appends the
+    identifiers of the state the prefix reaches in the hypothesis. Every pair of states shares one separating
+    sequence in their identifiers, which gives the same guarantee for extra_states as the W-method.
+    Separating sequences are taken from the witnesses in the observation tree when it is passed to find_cex, so they
+    are sequences on which the sul is already known to separate the states.
+    Tests are run like those of the W-method (merged into tries, optionally added to the tree and spread over worker SULs).
+    """
+    def _generate_test_suite(self, hypothesis, compiled_hypothesis, ob_tree, shuffle_seed, witnesses):
+        """
+        Returns the (lazy) test suite for the hypothesis: (state cover + transition cover) x middle x the identifiers
+        of the state that is reached
+        """
+        access_sequences = compiled_hypothesis.get_access_sequences()
+        tree_nodes = self._get_tree_nodes(access_sequences, ob_tree)
+        identifiers = self._compute_state_identifiers(compiled_hypothesis, tree_nodes, ob_tree, witnesses)
+        cover = access_sequences + [access_sequence + (letter,) for access_sequence in access_sequences for letter in self.alphabet]
+        return self._generate_identified_tests(compiled_hypothesis, cover, identifiers, shuffle_seed)
+
+    def _generate_identified_tests(self, hypothesis, cover, identifiers, shuffle_seed):
+        """
+        Lazily yields the tests of cover x middle x identifiers in a seeded pseudo-random order. The index space is
+        decoded as (cover, middle part, identifier) with room for the largest identifier set, positions beyond the
+        identifiers of the reached state are skipped.
+        """
+        alphabet = list(self.alphabet)
+        num_middle = sum(len(alphabet) ** i for i in range(self.k + 1))
+        num_identifiers = max(len(state_identifiers) for state_identifiers in identifiers)
+        cover_states = [hypothesis.get_state(sequence) for sequence in cover]
+
+        for index in IndexPermutation(len(cover) * num_middle * num_identifiers, shuffle_seed):
+            index, identifier_index = divmod(index, num_identifiers)
+            cover_index, middle_index = divmod(index, num_middle)
+            middle = self._get_middle(alphabet, middle_index)
+            state_identifiers = identifiers[hypothesis.get_state(middle, cover_states[cover_index])]
+            if identifier_index < len(state_identifiers):
+                yield cover[cover_index] + middle + state_identifiers[identifier_index]
+
+    def _get_tree_nodes(self, access_sequences, ob_tree):
+        """
+        Returns for every state id the tree node reached by its access sequence, or None if it is not in the tree
+        """
+        if ob_tree is None:
+            return [None] * len(access_sequences)
+        return [ob_tree.get_successor_unchecked(access_sequence) for access_sequence in access_sequences]
+
+    def _compute_state_identifiers(self, hypothesis, tree_nodes, ob_tree, witnesses):
+        """
+        Returns the harmonized identifiers of every state id: for each pair of states one separating sequence is
+        added to the identifiers of both
+        """
+        num_states = len(hypothesis.states)
+        identifiers = [[] for _ in range(num_states)]
+        separating_sequences = []
+        for state_one in range(num_states):
+            for state_two in range(state_one + 1, num_states):
+                separating_sequence = self._get_separating_sequence(hypothesis, state_one, state_two, tree_nodes, ob_tree, witnesses, separating_sequences)
+                identifiers[state_one].append(separating_sequence)
+                identifiers[state_two].append(separating_sequence)
+        return [self._remove_prefixes(state_identifiers) for state_identifiers in identifiers]
+
+    def _get_separating_sequence(self, hypothesis, state_one, state_two, tree_nodes, ob_tree, witnesses, separating_sequences):
+        """
+        Returns a sequence separating two state ids. A sequence already chosen for another pair is reused when it
+        separates these states too, which keeps the identifier sets small. Otherwise it is the witness the learner
+        passed for the pair or the witness of their tree nodes if they are apart in the tree (if the hypothesis
+        agrees), or else a shortest separating sequence of the hypothesis, and it is added to separating_sequences.
+        """
+        for separating_sequence in separating_sequences:
+            if hypothesis.compute_outputs(separating_sequence, state_one) != hypothesis.compute_outputs(separating_sequence, state_two):
+                return separating_sequence
+
+        separating_sequence = None
+        witness = witnesses.get((state_one, state_two))
+        if witness is not None and hypothesis.compute_outputs(witness, state_one) != hypothesis.compute_outputs(witness, state_two):
+            separating_sequence = witness
+        node_one, node_two = tree_nodes[state_one], tree_nodes[state_two]
+        if separating_sequence is None and node_one is not None and node_two is not None:
+            witness = Apartness.compute_witness(node_one, node_two, ob_tree)
+            if witness and hypothesis.compute_outputs(witness, state_one) != hypothesis.compute_outputs(witness, state_two):
+                separating_sequence = tuple(witness)
+        if separating_sequence is None:
+            separating_sequence = hypothesis.find_separating_sequence(state_one, state_two)
+        separating_sequences.append(separating_sequence)
+        return separating_sequence
+
+    @staticmethod
+    def _remove_prefixes(sequences):
+        """
+        Removes duplicates and sequences that are a prefix of another one, which the longer test already covers.
+        An empty set becomes the empty sequence, so every state still gets its tests.
+        """
+        sequences = list(dict.fromkeys(sequences))
+        kept = [
+            sequence for sequence in sequences
+            if not any(len(other) > len(sequence) and other[:len(sequence)] == sequence for other in sequences)
+        ]
+        return kept or [()]
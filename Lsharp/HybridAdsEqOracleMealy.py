@@ -0,0 +1,71 @@
+from ADS import Ads
+from HSIMethodEqOracleMealy import HSIMethodEqOracleMealy
+
+
+class HybridAdsEqOracleMealy(HSIMethodEqOracleMealy):
+    """
+    Equivalence oracle based on adaptive distinguishing sequences, the hybrid ADS method from 'Joshua Moerman.
+    Nominal techniques and black box testing for automata learning'. The identifier of a state is the run of one
+    ADS from that state, so a test usually appends a single sequence instead of a set. Pairs of states the ADS does
+    not separate get a separating sequence like in the HSI-method (the hybrid part).
+    The ADS is built with ADS.Ads on the tree nodes of the hypothesis states, so it only splits on outputs already
+    observed on the sul. As long as the sul answers like the hypothesis it makes the same choices, and the first
+    different output fails the test anyway, so the adaptive runs can be fixed up front from the hypothesis outputs.
+    """
+    def _compute_state_identifiers(self, hypothesis, tree_nodes, ob_tree, witnesses):
+        """
+        Returns the ADS run of every state id, extended with separating sequences for the pairs it does not separate
+        """
+        ads_runs = self._compute_ads_runs(hypothesis, tree_nodes, ob_tree)
+        num_states = len(hypothesis.states)
+        identifiers = [[ads_run] for ads_run in ads_runs]
+        separating_sequences = []
+        for state_one in range(num_states):
+            for state_two in range(state_one + 1, num_states):
+                if self._runs_separate(hypothesis, state_one, state_two, ads_runs):
+                    continue
+                separating_sequence = self._get_separating_sequence(hypothesis, state_one, state_two, tree_nodes, ob_tree, witnesses, separating_sequences)
+                identifiers[state_one].append(separating_sequence)
+                identifiers[state_two].append(separating_sequence)
+        return [self._remove_prefixes(state_identifiers) for state_identifiers in identifiers]
+
+    def _compute_ads_runs(self, hypothesis, tree_nodes, ob_tree):
+        """
+        Returns for every state id the inputs the ADS chooses when it is run on the hypothesis from that state.
+        All runs are empty when there are not two tree nodes to build the ADS on or the tree cannot split them.
+        """
+        block = {node for node in tree_nodes if node is not None}
+        if len(block) < 2:
+            return [()] * len(tree_nodes)
+        try:
+            ads = Ads(ob_tree, block)
+        except RuntimeError:
+            return [()] * len(tree_nodes)
+
+        ads_runs = []
+        for state in range(len(tree_nodes)):
+            ads.reset_to_root()
+            run = []
+            output = None
+            while True:
+                input_val = ads.next_input(output)
+                if input_val is None:
+                    break
+                run.append(input_val)
+                output = hypothesis.get_output(state, input_val)
+                state = hypothesis.get_successor(state, input_val)
+            ads_runs.append(tuple(run))
+        return ads_runs
+
+    @staticmethod
+    def _runs_separate(hypothesis, state_one, state_two, ads_runs):
+        """
+        Checks if the ADS runs of two state ids separate them: the runs are equal until the outputs of the two states
+        differ, so the states are separated on the common prefix of their runs
+        """
+        run_one, run_two = ads_runs[state_one], ads_runs[state_two]
+        common = 0
+        while common < min(len(run_one), len(run_two)) and run_one[common] == run_two[common]:
+            common += 1
+        prefix = run_one[:common]
+        return hypothesis.compute_outputs(prefix, state_one) != hypothesis.compute_outputs(prefix, state_two)
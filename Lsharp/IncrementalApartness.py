@@ -0,0 +1,88 @@
+from Apartness import Apartness
+
+class IncrementalApartness:
+    def __init__(self, ob_tree, basis):
+        """
+        Keeps track of the tree version at which the basis candidates of each frontier state were last checked,
+        so that only pairs of which a subtree has grown since then are checked again.
+        Candidates are bitmasks over the basis registry (see BasisRegistry).
+        """
+        self.ob_tree = ob_tree
+        self.basis = basis
+        self.checked_at = {}
+
+    def find_candidates(self, frontier_state):
+        """
+        Returns the mask of the basis states that are not apart from a (new) frontier state
+        """
+        self.checked_at[frontier_state] = self.ob_tree.version
+        basis_list = self.basis.states
+        apart = Apartness.pairs_are_apart([frontier_state] * len(basis_list), basis_list, self.ob_tree)
+        candidates = 0
+        for index, is_apart in enumerate(apart):
+            if not is_apart:
+                candidates |= 1 << index
+        return candidates
+
+    def update_candidates(self, frontier_state, candidates):
+        """
+        Removes the basis candidates that became apart from the frontier state since the last check, returns the new mask.
+        A pair is only checked again if the subtree of the frontier state or of the basis state has grown.
+        """
+        to_check = self._candidates_to_check(frontier_state, candidates)
+        if not to_check:
+            return candidates
+
+        apart = Apartness.pairs_are_apart([frontier_state] * len(to_check), to_check, self.ob_tree)
+        for basis_state, is_apart in zip(to_check, apart):
+            if is_apart:
+                candidates &= ~self.basis.get_bit(basis_state)
+        return candidates
+
+    def update_all_candidates(self, frontier_to_basis_dict):
+        """
+        Removes the basis candidates that became apart for all frontier states, checking all grown pairs in one batch
+        """
+        frontier_states = []
+        basis_states = []
+        for frontier_state, candidates in frontier_to_basis_dict.items():
+            to_check = self._candidates_to_check(frontier_state, candidates)
+            frontier_states.extend([frontier_state] * len(to_check))
+            basis_states.extend(to_check)
+
+        if not basis_states:
+            return
+
+        apart = Apartness.pairs_are_apart(frontier_states, basis_states, self.ob_tree)
+        for frontier_state, basis_state, is_apart in zip(frontier_states, basis_states, apart):
+            if is_apart:
+                frontier_to_basis_dict[frontier_state] &= ~self.basis.get_bit(basis_state)
+
+    def add_basis_state(self, new_basis, frontier_to_basis_dict):
+        """
+        Adds a new basis state (already in the registry) as candidate to all frontier states it is not apart from
+        """
+        frontier_states = list(frontier_to_basis_dict)
+        apart = Apartness.pairs_are_apart([new_basis] * len(frontier_states), frontier_states, self.ob_tree)
+        bit = self.basis.get_bit(new_basis)
+        for frontier_state, is_apart in zip(frontier_states, apart):
+            if not is_apart:
+                frontier_to_basis_dict[frontier_state] |= bit
+
+    def forget(self, frontier_state):
+        """
+        Removes the bookkeeping of a frontier state which is promoted to the basis
+        """
+        self.checked_at.pop(frontier_state, None)
+
+    def _candidates_to_check(self, frontier_state, candidates):
+        """
+        Returns the candidates of which the apartness with the frontier state may have changed since the last check
+        """
+        checked_version = self.checked_at.get(frontier_state, -1)
+        self.checked_at[frontier_state] = self.ob_tree.version
+
+        basis_list = self.basis.get_states(candidates)
+        if frontier_state.version > checked_version:
+            return basis_list
+        return [basis_state for basis_state in basis_list if basis_state.version > checked_version]
@@ -0,0 +1,42 @@
+from random import Random, getrandbits
+
+class IndexPermutation:
+    """
+    Seeded pseudo-random bijection on range(size) that needs constant memory, so a huge index space can be visited
+    in shuffled order without materializing it. Uses a balanced Feistel network on the smallest even number of bits
+    covering the size, and cycle walking to map back into range(size).
+    """
+    _rounds = 4
+
+    def __init__(self, size, seed=None):
+        self.size = size
+        self.half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+        self.mask = (1 << self.half_bits) - 1
+        random = Random(seed) if seed is not None else None
+        self.keys = [random.getrandbits(32) if random else getrandbits(32) for _ in range(self._rounds)]
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        """ Yields all indices in permuted order """
+        for index in range(self.size):
+            yield self[index]
+
+    def __getitem__(self, index):
+        """ Returns the index at the given position of the permutation """
+        while True:
+            index = self._encrypt(index)
+            if index < self.size:
+                return index
+
+    def _encrypt(self, index):
+        half_bits = self.half_bits
+        mask = self.mask
+        left = index >> half_bits
+        right = index & mask
+        for key in self.keys:
+            mixed = ((right ^ key) * 0x9E3779B1) & 0xFFFFFFFF
+            mixed ^= mixed >> 15
+            left, right = right, left ^ (mixed & mask)
+        return (left << half_bits) | right
@@ -1,13 +1,25 @@
+import asyncio
+import warnings
 from aalpy.base import Oracle, SUL
 from ObservationTree import ObservationTree
+from CompactObservationTree import CompactObservationTree
 from aalpy.automata import MealyMachine, MealyState
 from WMethodEqOracleMealy import WMethodEqOracleMealy
 from Apartness import Apartness
-from ADS import Ads
+from IncrementalApartness import IncrementalApartness
+from BasisRegistry import BasisRegistry
+from FrontierCandidates import FrontierCandidates
+from ADS import Ads, AdsCache
+from CompiledHypothesis import CompiledHypothesis
+from WitnessCache import WitnessCache
+from QueryScheduler import QueryScheduler, SerialQueryExecutor
+from Checkpoint import Checkpoint
+from Profiler import LearningProfiler
 
 class Lsharp:
     def __init__(self, alphabet: set, sul: SUL, eq_oracle: Oracle, extension_rule="Nothing", separation_rule="SepSeq", seed=None, 
-               max_learning_rounds=None):
+               max_learning_rounds=None, compact_tree=False, query_executor=None, checkpoint_file=None,
+               profile=False):
         """
         Args:
         alphabet: input alphabet
@@ -15,27 +27,54 @@ class Lsharp:
         eq_oracle: equivalence oracle
         max_learning_rounds: number of learning rounds after which learning terminates.
         ob_tree: observation tree
-        frontier_to_basis_dict: dictionary of the frontier states
-        witness_cache: the witness cache
-        apartness_cache: cache for the apartness computations
+        basis: the basis states in order of promotion (a BasisRegistry, which numbers them for the candidate masks)
+        frontier_to_basis_dict: dictionary of the frontier states to the bitmask of their basis candidates, which also
+                                tracks the isolated and ambiguous frontier states (a FrontierCandidates)
+        pending_transitions: the basis transitions whose successor is not (yet) a basis or frontier state, most of
+                             them not observed yet, so completing the basis only visits these
+        hypothesis: the current hypothesis, one MealyMachine that is patched as the basis and frontier change
+        basis_to_mealy_dict, mealy_to_basis_dict: the basis states and the hypothesis states they became, both ways
+        hypothesis_frontier: the basis state every frontier state was mapped to when the hypothesis was last patched
+        compiled_hypothesis: the current hypothesis compiled to integer tables, used to simulate it
+        witness_cache: least recently used cache of the witnesses between pairs of tree nodes
+        ads_cache: cache of ADS trees per block of tree nodes, valid until the tree grows under the block
+        apartness: incremental apartness checks between frontier and basis states
         extension_rule: Setting [Nothing, SepSeq, ADS]
         separation_rule: Setting [SepSeq, ADS]
+        compact_tree: store the observation tree in flat arrays (CompactObservationTree) to save memory
+        query_executor: runs batches of independent output queries, defaults to one query at a time on the sul
+                        (AsyncQueryExecutor keeps a batch in flight over a pool of AsyncSUL connections, it also
+                        batches the adaptive queries of the ADS rules)
+        checkpoint_file: file to which the tree, basis, frontier and witnesses are appended after every learning round,
+                         see resume and warm_start
+        profile: time the phases of every learning round and record the tree, basis and frontier sizes and cache hit
+                 rates per round in self.profiler (a LearningProfiler), without it no timing code runs at all
         """
         self.alphabet = alphabet
         self.sul = sul
         self.eq_oracle = eq_oracle
         self.max_learning_rounds = max_learning_rounds
-        self.ob_tree = ObservationTree(alphabet)
-        self.ob_tree.root.reset_id_counter()
-        self.basis = set()
-        self.frontier_to_basis_dict = {}   
+        self.ob_tree = CompactObservationTree(alphabet) if compact_tree else ObservationTree(alphabet)
+        self.basis = BasisRegistry()
+        self.apartness = IncrementalApartness(self.ob_tree, self.basis)
+        self.frontier_to_basis_dict = FrontierCandidates()
+        self.pending_transitions = {}
+        self.hypothesis = None
         self.basis_to_mealy_dict = {}
-        self.witness_cache = {}
+        self.mealy_to_basis_dict = {}
+        self.hypothesis_frontier = {}
+        self.compiled_hypothesis = None
+        self.witness_cache = WitnessCache(self.ob_tree)
+        self.ads_cache = AdsCache()
+        self.query_scheduler = QueryScheduler(self.ob_tree, query_executor or SerialQueryExecutor(sul))
         self.extension_rule = extension_rule
         self.separation_rule = separation_rule
         self.results = [0,0,0,0,0]
         self.seed = seed
-        
+        self.checkpoint = Checkpoint(checkpoint_file) if checkpoint_file else None
+        self.resumed_rounds = 0
+        self.profiler = LearningProfiler(self) if profile else None
+
     def run_Lsharp(self):
         """
         Executes the L# algorithm (prefix-tree based automaton learning).
@@ -44,8 +83,14 @@ class Lsharp:
         assert self.extension_rule in {"Nothing", "SepSeq", "ADS"}
         assert self.separation_rule in {"SepSeq", "ADS"}
 
-        learning_rounds = 0
+        learning_rounds = self.resumed_rounds
         self.basis.add(self.ob_tree.root)
+        # after a resume the basis is restored without its pending transitions, so all basis states are added once
+        self._add_pending_transitions(self.basis)
+        if self.checkpoint is not None and self.checkpoint.file is None:
+            self.checkpoint.start(self)
+        if self.profiler is not None:
+            self.profiler.start()
 
         self.sul.post()
         self.sul.pre()
@@ -59,29 +104,94 @@ class Lsharp:
             hypothesis = self._build_hypothesis()
 
             # Added size for obtree
-            self.results[4] = self.ob_tree.root._id_counter
+            self.results[4] = self.ob_tree.get_size()
 
-            if (len(self.sul.automaton.states) == len(hypothesis.states)):
+            if hasattr(self.sul, "automaton") and len(self.sul.automaton.states) == len(hypothesis.states):
+                self._end_round(learning_rounds)
                 return hypothesis, self.results, learning_rounds
 
-            if isinstance(self.eq_oracle, WMethodEqOracleMealy):
-                counter_example = self.eq_oracle.find_cex(hypothesis, self.ob_tree, self.seed)
-                self.results[2] = self.eq_oracle.resets
-                self.results[3] = self.eq_oracle.num_steps
-            else:
-                counter_example = self.eq_oracle.find_cex(hypothesis)
-                if counter_example is not None:
-                    self.results[2] = self.eq_oracle.num_queries
-                    self.results[3] = self.eq_oracle.num_steps
-
+            counter_example = self._find_counter_example(hypothesis)
             if counter_example is None:
+                self._end_round(learning_rounds)
                 return hypothesis, self.results, learning_rounds
 
-            cex_outputs = self.sul.query(counter_example)
-            self._process_counter_example(hypothesis, counter_example, cex_outputs)
+            cex_outputs = self.ob_tree.get_observation(counter_example)
+            if cex_outputs is None:
+                cex_outputs = self.sul.query(counter_example)
+            self._process_counter_example(self.compiled_hypothesis, counter_example, cex_outputs)
+
+            self._end_round(learning_rounds)
 
         raise Exception("Exceeded Max number of learning rounds")
 
+    def resume(self):
+        """
+        Restores the state of the last saved learning round from the checkpoint file, run_Lsharp then continues with
+        the next round. Must be called on a new learner for the same system.
+        """
+        self.resumed_rounds = self.checkpoint.resume(self)
+        if isinstance(self.eq_oracle, WMethodEqOracleMealy):
+            self.eq_oracle.resets = self.results[2]
+            self.eq_oracle.num_steps = self.results[3]
+
+    def warm_start(self, checkpoint_file):
+        """
+        Starts from the observations of an earlier run, e.g. on an older version of the system. All maximal
+        observations of its checkpoint file are queried again on the sul, so the tree only holds outputs of the
+        current system. Must be called on a new learner before run_Lsharp.
+        """
+        if self.checkpoint is not None and self.checkpoint.file is None:
+            self.checkpoint.start(self)
+        for inputs in Checkpoint(checkpoint_file).read_maximal_sequences(self.alphabet):
+            self.query_scheduler.add(inputs)
+        self._run_scheduled_queries()
+
+    def _get_basis_witnesses(self):
+        """
+        Returns the cached witnesses between basis states as a dict from pairs of hypothesis states
+        """
+        witnesses = {}
+        basis = self.basis.states
+        for index, basis_one in enumerate(basis):
+            for basis_two in basis[index + 1:]:
+                witness = self.witness_cache.get_cached(basis_one, basis_two)
+                if witness is not None:
+                    witnesses[(self.basis_to_mealy_dict[basis_one], self.basis_to_mealy_dict[basis_two])] = witness
+        return witnesses
+
+    def _end_round(self, learning_round):
+        """
+        Appends the state at the end of a learning round to the checkpoint file and stores the profile of the round,
+        if the learner has them
+        """
+        if self.checkpoint is not None:
+            self.checkpoint.save(self, learning_round)
+        if self.profiler is not None:
+            self.profiler.end_round(learning_round)
+
+    def _find_counter_example(self, hypothesis):
+        """
+        Asks the equivalence oracle for a counter example to the hypothesis and updates the test metrics
+        """
+        if isinstance(self.eq_oracle, WMethodEqOracleMealy):
+            counter_example = self.eq_oracle.find_cex(hypothesis, self.ob_tree, self.seed, self._get_basis_witnesses(),
+                                                      self.compiled_hypothesis)
+            self.results[2] = self.eq_oracle.resets
+            self.results[3] = self.eq_oracle.num_steps
+        else:
+            counter_example = self.eq_oracle.find_cex(hypothesis)
+            if counter_example is not None:
+                self.results[2] = self.eq_oracle.num_queries
+                self.results[3] = self.eq_oracle.num_steps
+        return counter_example
+
+    async def run_Lsharp_async(self):
+        """
+        Executes run_Lsharp in a worker thread, so that an AsyncSULBridge (as sul and oracle sul) can run the
+        queries as coroutines on the event loop of the caller while the learner waits for them.
+        """
+        return await asyncio.to_thread(self.run_Lsharp)
+
     def _build_hypothesis(self):
         """
         Builds the hypothesis which will be sent to the SUL
@@ -94,13 +204,13 @@ class Lsharp:
 
             hypothesis = self._construct_hypothesis()
 
-            counter_example = Apartness.compute_witness_in_tree_and_hypothesis(self.ob_tree, hypothesis)
+            counter_example = self._find_tree_conflict()
 
             if not counter_example:
                 return hypothesis
 
-            cex_outputs = self.ob_tree.get_observation(counter_example)
-            self._process_counter_example(hypothesis, counter_example, cex_outputs)
+            cex_outputs = self.ob_tree.get_observation_unchecked(counter_example)
+            self._process_counter_example(self.compiled_hypothesis, counter_example, cex_outputs)
 
 
     def _make_observation_tree_adequate(self):
@@ -133,105 +243,97 @@ class Lsharp:
             print(f"Warning: {frontier_state} not found in frontier_to_basis_dict.")
             return
         
-        basis_list = self.frontier_to_basis_dict[frontier_state]
-        self.frontier_to_basis_dict[frontier_state] = [
-            basis_state for basis_state in basis_list 
-            if not Apartness.states_are_apart(frontier_state, basis_state, self.ob_tree)
-        ]
+        candidates = self.frontier_to_basis_dict[frontier_state]
+        self.frontier_to_basis_dict[frontier_state] = self.apartness.update_candidates(frontier_state, candidates)
 
     def _update_frontier_to_basis_dict(self):
         """
         Checks for basis candidates (basis states with the same behavior) for each frontier state.
         If a frontier state and a basis state are "apart", the basis state is removed from the basis list.
         """
-        for frontier_state, basis_list in self.frontier_to_basis_dict.items():
-            self.frontier_to_basis_dict[frontier_state] = [
-                basis_state for basis_state in basis_list 
-                if not Apartness.states_are_apart(frontier_state, basis_state, self.ob_tree)
-            ]               
+        self.apartness.update_all_candidates(self.frontier_to_basis_dict)
 
     def _promote_frontier_state(self):
         """
         Searches for a isolated frontier state and adds it to the basis states if it is not associated with another basis state
         """
-        for iso_frontier_state, basis_list in self.frontier_to_basis_dict.items():
-            if not basis_list:
-                new_basis = iso_frontier_state
-                self.basis.add(new_basis)
-                self.frontier_to_basis_dict.pop(new_basis)
+        isolated = self.frontier_to_basis_dict.isolated
+        if isolated:
+            # the first isolated state in frontier order, like a scan of the whole frontier would find
+            new_basis = next(frontier_state for frontier_state in self.frontier_to_basis_dict if frontier_state in isolated)
+            self.basis.add(new_basis)
+            self.frontier_to_basis_dict.pop(new_basis)
+            self.apartness.forget(new_basis)
+            self.apartness.add_basis_state(new_basis, self.frontier_to_basis_dict)
+            self._add_pending_transitions([new_basis])
 
-                for frontier_state, new_basis_list in self.frontier_to_basis_dict.items():
-                    if not Apartness.states_are_apart(new_basis, frontier_state, self.ob_tree):
-                        new_basis_list.append(new_basis)
-                break       
+    def _add_pending_transitions(self, basis_states):
+        """
+        Adds the transitions of (new) basis states to the pending transitions, _check_frontier_consistency sorts them out
+        """
+        for basis_state in basis_states:
+            for input in self.alphabet:
+                self.pending_transitions[(basis_state, input)] = None
 
     def _check_frontier_consistency(self):
         """
-        Checks if all the states are correctly defined and creates new frontier states when possible 
+        Creates the frontier states of the pending transitions that are observed by now, only the transitions that
+        are still not observed stay pending
         """
-        for basis_state in self.basis:
-            for input in self.alphabet:
-                maybe_frontier = basis_state.get_successor(input)
-                if (maybe_frontier == None or maybe_frontier in self.basis or maybe_frontier in self.frontier_to_basis_dict):
-                    continue
-                
-                self.frontier_to_basis_dict[maybe_frontier] = [
-                    new_basis_state for new_basis_state in self.basis 
-                    if not Apartness.states_are_apart(new_basis_state, maybe_frontier, self.ob_tree)
-                ]
+        for basis_state, input in list(self.pending_transitions):
+            maybe_frontier = basis_state.get_successor(input)
+            if maybe_frontier is None:
+                continue
+
+            self.pending_transitions.pop((basis_state, input), None)
+            if maybe_frontier in self.basis or maybe_frontier in self.frontier_to_basis_dict:
+                continue
+            self.frontier_to_basis_dict[maybe_frontier] = self.apartness.find_candidates(maybe_frontier)
 
     def _is_observation_tree_adequate(self):
         """
         Check if the frontier state have only 1 basis candidate, and if all basis states have some output for every input.
+        After the pending transitions are sorted out this only looks at the sizes of the tracked sets.
         """
         self._check_frontier_consistency()
-        for _, basis_list in self.frontier_to_basis_dict.items():
-            if len(basis_list) != 1:
-                return False
-        
-        for basis_state in self.basis:
-            for input in self.alphabet:
-                if basis_state.get_output(input) is None:
-                    return False
-        
-        return True
+        return not (self.pending_transitions or self.frontier_to_basis_dict.isolated or self.frontier_to_basis_dict.ambiguous)
 
     def _make_basis_complete(self):
         """
         Explore new frontier states and adding them to the frontier to basis map
         """
-        for basis_state in self.basis:
-            for input in self.alphabet:
-                if basis_state.get_successor(input) is None:
-                    self._explore_frontier(basis_state, input)
-                    new_frontier = basis_state.get_successor(input)
-                    basis_candidates = self._find_basis_candidates(new_frontier)
-                    self.frontier_to_basis_dict[new_frontier] = basis_candidates
+        missing_transitions = list(self.pending_transitions)
+        for basis_state, input in missing_transitions:
+            self._explore_frontier(basis_state, input)
+        self._run_scheduled_queries()
+
+        for basis_state, input in missing_transitions:
+            new_frontier = basis_state.get_successor(input)
+            basis_candidates = self._find_basis_candidates(new_frontier)
+            self.frontier_to_basis_dict[new_frontier] = basis_candidates
+            self.pending_transitions.pop((basis_state, input), None)
 
     def _find_basis_candidates(self, new_frontier):
-        return (
-            new_basis_state for new_basis_state in self.basis
-            if not Apartness.states_are_apart(new_basis_state, new_frontier, self.ob_tree)
-        )
+        return self.apartness.find_candidates(new_frontier)
 
 
     def _explore_frontier(self, basis_state, input):
         """
-        explores a specific frontier state (basis state + input) by passing a query to the sul
+        explores a specific frontier state (basis state + input) by passing a query to the sul.
+        Queries are scheduled and sent by _run_scheduled_queries, adaptive queries are sent right away unless the
+        query executor batches them.
         """
         if (self.extension_rule == "ADS"):
-            suffix = Ads(self.ob_tree, self.basis)
+            suffix = self._construct_ads(self.basis)
+            if self.query_scheduler.batches_adaptive_queries:
+                self._schedule_adaptive_query(self.ob_tree.get_transfer_sequence(self.ob_tree.root, basis_state) + (input,), suffix)
+                return
             ads_in, ads_out = self._adaptive_output_query(self.ob_tree.get_transfer_sequence(self.ob_tree.root, basis_state), input, suffix)
-            self.ob_tree.insert_observation(ads_in, ads_out)
+            self.ob_tree.insert_observation_unchecked(ads_in, ads_out)
             return 
 
         if (self.extension_rule == "Nothing" or (self.extension_rule == "SepSeq" and len(self.basis) == 1)):
-            inputs = self.ob_tree.get_transfer_sequence(self.ob_tree.root, basis_state)
-            inputs.append(input)
-            outputs = self.sul.query(inputs) # LEARNING
-            self.results[0] += 1
-            self.results[1] += len(inputs)
-            self.ob_tree.insert_observation(inputs, outputs)
+            self.query_scheduler.add(self.ob_tree.get_transfer_sequence(self.ob_tree.root, basis_state) + (input,))
             return
 
         if (self.extension_rule == "SepSeq"):
@@ -239,75 +341,88 @@ class Lsharp:
             basis_one = next(iterator)
             basis_two = next(iterator)
 
-            witness = self._get_or_compute_witness(basis_one, basis_two)
-            inputs = self.ob_tree.get_transfer_sequence(self.ob_tree.root, basis_state)
-            inputs.append(input)
-            inputs.extend(witness)
-            outputs = self.sul.query(inputs) # LEARNING
-            self.results[0] += 1
-            self.results[1] += len(inputs)
-            self.ob_tree.insert_observation(inputs, outputs)
+            witness = self.witness_cache.get_or_compute(basis_one, basis_two)
+            self.query_scheduler.add(self.ob_tree.get_transfer_sequence(self.ob_tree.root, basis_state) + (input,) + witness)
             return
 
+    def _run_scheduled_queries(self):
+        """
+        Sends all scheduled output queries to the sul as one batch and inserts the outputs into the tree
+        """
+        num_queries, num_steps = self.query_scheduler.run() # LEARNING
+        self.results[0] += num_queries
+        self.results[1] += num_steps
+
+    def _construct_ads(self, block):
+        """
+        Constructs an adaptive distinguishing sequence for a block of basis states
+        """
+        return Ads(self.ob_tree, block, self.ads_cache)
+
+    def _output_query(self, inputs):
+        """
+        Sends a single output query to the sul and returns the outputs
+        """
+        outputs = self.sul.query(inputs) # LEARNING
+        self.results[0] += 1
+        self.results[1] += len(inputs)
+        return outputs
+
     def _adaptive_output_query(self, prefix, infix, suffix):
         """
         Adds input to the prefix and calls the base function
         """
-        prefix.append(infix)
-        return self._adaptive_output_query_base(prefix, suffix)
+        return self._adaptive_output_query_base(prefix + (infix,), suffix)
 
     def _adaptive_output_query_base(self, prefix, suffix):
         """
         Query the tree for a result, if unsuccesful query the sul and update the tree
         """
-        from_node = self.ob_tree.get_successor(prefix)
-        if from_node:
-            tree_in, tree_out = self._answer_ads_from_tree(suffix, from_node)
-            suffix.reset_to_root()
-
-            if tree_out:
-                inputs = prefix
-                outputs = self.ob_tree.get_observation(prefix)
-                inputs.extend(tree_in)
-                outputs.extend(tree_out)
-                return (inputs, outputs)
+        tree_answer = self._answer_adaptive_query_from_tree(prefix, suffix)
+        if tree_answer:
+            return tree_answer
 
         # removed prefix call here
-        sul_in, sul_out = self._sul_adaptive_query(prefix, suffix)
+        sul_in, sul_out = self._sul_adaptive_query(list(prefix), suffix)
         if sul_out:
             outputs = sul_out
         
-        self.ob_tree.insert_observation(sul_in, outputs)
+        self.ob_tree.insert_observation_unchecked(sul_in, outputs)
 
         return sul_in, outputs
     
-    def _sul_adaptive_query(self, inputs, ads):
+    def _schedule_adaptive_query(self, prefix, suffix):
         """
-        sends inputs to the sul and returns the output
+        Query the tree for a result, if unsuccesful schedule the adaptive query, so that _run_scheduled_queries sends
+        it together with the other adaptive queries and updates the tree
         """
-        outputs_received = []
-        last_output = None
+        if not self._answer_adaptive_query_from_tree(prefix, suffix):
+            self.query_scheduler.add_adaptive(prefix, suffix)
 
-        self.sul.post()
-        self.sul.pre()
+    def _answer_adaptive_query_from_tree(self, prefix, suffix):
+        """
+        Returns the inputs and outputs of the adaptive query if the tree has all of them, otherwise None
+        """
+        from_node = self.ob_tree.get_successor_unchecked(prefix)
+        if from_node:
+            tree_in, tree_out = self._answer_ads_from_tree(suffix, from_node)
+            suffix.reset_to_root()
 
-        for input in inputs:
-            output = self.sul.step(input)
-            # removed reset
-            self.results[1] += 1
-            outputs_received.append(output)
+            if tree_out:
+                inputs = list(prefix)
+                outputs = self.ob_tree.get_observation_unchecked(prefix)
+                inputs.extend(tree_in)
+                outputs.extend(tree_out)
+                return (inputs, outputs)
 
-        while True:
-            next_input = ads.next_input(last_output)
-            if next_input is None:
-                break
-            inputs.append(next_input)
-            output = self.sul.step(next_input)
-            # removed reset
-            self.results[1] += 1
-            outputs_received.append(output)
-            last_output = output
+    def _sul_adaptive_query(self, inputs, ads):
+        """
+        sends inputs to the sul and returns the output, the ads chooses each next input based on the previous output
+        """
+        self.sul.post()
+        inputs, outputs_received = self.sul.adaptive_query(inputs, ads) # LEARNING
         self.results[0] += 1
+        self.results[1] += len(outputs_received)
 
         return inputs, outputs_received
 
@@ -338,122 +453,147 @@ class Lsharp:
         ads.reset_to_root()
         return inputs_sent, outputs_received
 
-    def _get_or_compute_witness(self, state_one, state_two):
-        """
-        Get witness by checking cache and computing it otherwise
-        """
-        pair_one = str(state_one.id) + "-" + str(state_two.id)
-        if (pair_one in self.witness_cache):
-            return self.witness_cache.get(pair_one)
-        
-        pair_two = str(state_two.id) + "-" + str(state_one.id)
-        if (pair_two in self.witness_cache):
-            return self.witness_cache.get(pair_two)
-        
-        witness = Apartness.compute_witness(state_one, state_two, self.ob_tree)
-        self.witness_cache[pair_one] = witness
-        self.witness_cache[pair_two] = witness
-        return witness
-    
     def _make_frontiers_identified(self):
         """
         Loop over all frontier states to indentify them
         """
+        scheduled = []
         for frontier_state in self.frontier_to_basis_dict:
-            self._identify_frontier(frontier_state)
+            old_candidate_size = self._identify_frontier(frontier_state)
+            if old_candidate_size is not None:
+                scheduled.append((frontier_state, old_candidate_size))
+        self._run_scheduled_queries()
+
+        for frontier_state, old_candidate_size in scheduled:
+            self._check_identification(frontier_state, old_candidate_size)
 
     def _identify_frontier(self, frontier_state):
         """
-        Identify a specific frontier state
+        Identify a specific frontier state. A separating sequence query (or an adaptive query, if the query executor
+        batches them) is only scheduled, in which case the old number of candidates is returned so they can be
+        checked after the batch has run.
         """
         if frontier_state not in self.frontier_to_basis_dict:
             raise Exception(f"Warning: {frontier_state} not found in frontier_to_basis_dict.")
         
         self._update_basis_candidates(frontier_state)
-        old_candidate_size = len(self.frontier_to_basis_dict.get(frontier_state))
+        old_candidate_size = self.frontier_to_basis_dict[frontier_state].bit_count()
         if (old_candidate_size < 2):
             return
         
         if (self.separation_rule == "SepSeq" or old_candidate_size == 2):
-            inputs, outputs = self._identify_frontier_sepseq(frontier_state)
-        else:
-            inputs, outputs = self._identify_frontier_ads(frontier_state)
+            self.query_scheduler.add(self._identify_frontier_sepseq(frontier_state))
+            return old_candidate_size
+
+        if self.query_scheduler.batches_adaptive_queries:
+            self._schedule_adaptive_query(*self._identify_frontier_ads(frontier_state))
+            return old_candidate_size
 
-        self.ob_tree.insert_observation(inputs, outputs)
+        inputs, outputs = self._adaptive_output_query_base(*self._identify_frontier_ads(frontier_state))
+        self.ob_tree.insert_observation_unchecked(inputs, outputs)
+        self._check_identification(frontier_state, old_candidate_size)
+
+    def _check_identification(self, frontier_state, old_candidate_size):
+        """
+        Updates the candidates of a frontier state after its identification query and warns if none were removed
+        """
         self._update_basis_candidates(frontier_state)
-        if (len(self.frontier_to_basis_dict.get(frontier_state)) == old_candidate_size):
-            print("specific identification did not increase the norm")
+        if (self.frontier_to_basis_dict[frontier_state].bit_count() == old_candidate_size):
+            warnings.warn("specific identification did not increase the norm")
 
     def _identify_frontier_sepseq(self, frontier_state):
         """
-        Specifically identify using sepseq
+        Specifically identify using sepseq, returns the query to send
         """
-        basis_candidates = self.frontier_to_basis_dict.get(frontier_state)
-        iterator = basis_candidates
-        basis_one = iterator[0]
-        basis_two = iterator[1]
+        basis_one, basis_two = self.basis.get_states(self.frontier_to_basis_dict[frontier_state])[:2]
 
-        witness = self._get_or_compute_witness(basis_one, basis_two)
+        witness = self.witness_cache.get_or_compute(basis_one, basis_two)
 
-        inputs = self.ob_tree.get_transfer_sequence(self.ob_tree.root, frontier_state)
-        inputs.extend(witness)
-
-        outputs = self.sul.query(inputs) # LEARNING
-        self.results[0] += 1
-        self.results[1] += len(inputs)
-
-        return inputs, outputs
+        return self.ob_tree.get_transfer_sequence(self.ob_tree.root, frontier_state) + witness
 
     def _identify_frontier_ads(self, frontier_state):
         """
-        Specifically indentify using ADS
+        Specifically indentify using ADS, returns the access sequence of the frontier state and the ADS to query after it
         """
-        basis_candidates = self.frontier_to_basis_dict.get(frontier_state)
-        suffix = Ads(self.ob_tree, set(basis_candidates))
-        return self._adaptive_output_query_base(self.ob_tree.get_transfer_sequence(self.ob_tree.root, frontier_state), suffix)
+        basis_candidates = self.basis.get_states(self.frontier_to_basis_dict[frontier_state])
+        suffix = self._construct_ads(set(basis_candidates))
+        return self.ob_tree.get_transfer_sequence(self.ob_tree.root, frontier_state), suffix
 
     def _construct_hypothesis(self):
         """
-        Construct a hypothesis (Mealy Machine) based on the observation tree
+        Updates the hypothesis (Mealy Machine) to the observation tree. The hypothesis is kept between calls: new basis
+        states are added as new states and only the transitions into new basis states or into frontier states that
+        are mapped to another basis state are redirected, so the state ids stay the same across learning rounds.
+        The compiled hypothesis is patched along with it and the characterization set is cleared if anything changed.
+        """
+        new_basis = self.basis.states[len(self.basis_to_mealy_dict):]
+        for basis_state in new_basis:
+            mealy_state = MealyState(f's{len(self.basis_to_mealy_dict)}')
+            self.basis_to_mealy_dict[basis_state] = mealy_state
+            self.mealy_to_basis_dict[mealy_state] = basis_state
+            self.hypothesis_frontier.pop(basis_state, None)
+            if self.hypothesis is None:
+                self.hypothesis = MealyMachine(mealy_state, [])
+            self.hypothesis.states.append(mealy_state)
+            if self.compiled_hypothesis is not None:
+                self.compiled_hypothesis.add_state(mealy_state)
+
+        patched = bool(new_basis)
+        for basis_state in new_basis:
+            for input_val in self.alphabet:
+                self._patch_transition(basis_state, input_val)
+            if basis_state.parent is not None:
+                self._patch_transition(basis_state.parent, basis_state.input_to_parent)
+
+        for frontier_state, candidates in self.frontier_to_basis_dict.items():
+            if candidates.bit_count() > 1:
+                raise RuntimeError("Multiple basis candidates for a single frontier state.")
+            if self.hypothesis_frontier.get(frontier_state) != self.basis.get_first(candidates):
+                self._patch_transition(frontier_state.parent, frontier_state.input_to_parent)
+                patched = True
+
+        if self.compiled_hypothesis is None:
+            self.compiled_hypothesis = CompiledHypothesis(self.hypothesis, self.alphabet)
+        if patched:
+            self.hypothesis.characterization_set = []
+        return self.hypothesis
+
+    def _patch_transition(self, basis_state, input_val):
+        """
+        Sets the transition of the hypothesis state of a basis state to the basis state its tree successor is (mapped to)
         """
-        self.basis_to_mealy_dict.clear()
-        state_counter = 0
-        for basis_state in self.basis:
-            state_id = f's{state_counter}'
-            self.basis_to_mealy_dict[basis_state] = MealyState(state_id)
-            state_counter += 1
+        output = basis_state.get_output(input_val)
+        successor = basis_state.get_successor(input_val)
+        destination = successor
+        if successor in self.frontier_to_basis_dict:
+            candidates = self.frontier_to_basis_dict[successor]
+            if candidates.bit_count() > 1:
+                raise RuntimeError("Multiple basis candidates for a single frontier state.")
+            destination = self.basis.get_first(candidates)
+            self.hypothesis_frontier[successor] = destination
 
-        mealy_states = []
-        for basis_state in self.basis:
-            source = self.basis_to_mealy_dict[basis_state]
-            for input_val in self.alphabet:
-                output = basis_state.get_output(input_val)
-                successor = basis_state.get_successor(input_val)
-
-                if successor in self.frontier_to_basis_dict:
-                    candidates = self.frontier_to_basis_dict[successor]
-                    if len(candidates) > 1:
-                        raise RuntimeError("Multiple basis candidates for a single frontier state.")
-                    successor = next(iter(candidates))
-
-                if successor not in self.basis_to_mealy_dict:
-                    raise RuntimeError("Successor is not in the basisToStateMap.")
-                
-                source.output_fun[input_val] = output
-                destination = self.basis_to_mealy_dict[successor]
-                source.transitions[input_val] = destination
-            
-            mealy_states.append(source)
-
-        hypothesis = MealyMachine(self.basis_to_mealy_dict[self.ob_tree.root], mealy_states)
-        return hypothesis
+        if destination not in self.basis_to_mealy_dict:
+            raise RuntimeError("Successor is not in the basisToStateMap.")
+
+        source = self.basis_to_mealy_dict[basis_state]
+        source.output_fun[input_val] = output
+        source.transitions[input_val] = self.basis_to_mealy_dict[destination]
+        if self.compiled_hypothesis is not None:
+            compiled = self.compiled_hypothesis
+            compiled.set_transition(compiled.state_index[source], input_val, compiled.state_index[source.transitions[input_val]], output)
+
+    def _find_tree_conflict(self):
+        """
+        Returns the inputs of an observation in the tree that the current hypothesis contradicts, or None
+        """
+        return Apartness.compute_witness_in_tree_and_hypothesis(self.ob_tree, self.compiled_hypothesis)
 
     def _process_counter_example(self, hypothesis, cex_inputs, cex_outputs):
         """
         Inserts the counter example into the observation tree and searches for the input-output sequence which is different
         """
-        self.ob_tree.insert_observation(cex_inputs, cex_outputs)
-        hyp_outputs = hypothesis.compute_output_seq(hypothesis.initial_state, cex_inputs)
+        self.ob_tree.insert_observation_unchecked(cex_inputs, cex_outputs)
+        hyp_outputs = hypothesis.compute_outputs(cex_inputs)
         prefix_index = self._get_counter_example_prefix_index(cex_outputs, hyp_outputs)
         self._process_binary_search(hypothesis, cex_inputs[:prefix_index], cex_outputs[:prefix_index])
 
@@ -468,58 +608,66 @@ class Lsharp:
     
     def _process_binary_search(self, hypothesis, cex_inputs, cex_outputs):
         """
-        use binary search on the counter example to compute a witness between the real system and the hypothesis
+        use binary search on the counter example to compute a witness between the real system and the hypothesis.
+        The tree nodes and hypothesis states along the current counter example are kept in two paths, so every
+        step of the search walks the counter example at most once.
         """
-        tree_node = self.ob_tree.get_successor(cex_inputs)
-        self._update_frontier_and_basis()
+        cex_inputs = list(cex_inputs)
+        tree_path = self._get_tree_path(cex_inputs)
+        hyp_path = hypothesis.get_states(cex_inputs)
 
-        if(tree_node in self.frontier_to_basis_dict or tree_node in self.basis):
-            return
-        
-        hyp_state = self._get_mealy_successor(hypothesis, hypothesis.initial_state, cex_inputs)
-        hyp_node = list(self.basis_to_mealy_dict.keys())[list(self.basis_to_mealy_dict.values()).index(hyp_state)]
+        while True:
+            tree_node = tree_path[-1]
+            self._update_frontier_and_basis()
 
-        prefix = []
-        current_state = self.ob_tree.root
-        for input in cex_inputs:
-            if current_state in self.frontier_to_basis_dict:
-                break
-            current_state = current_state.get_successor(input)
-            prefix.append(input)
+            if(tree_node in self.frontier_to_basis_dict or tree_node in self.basis):
+                return
 
-        h = (len(prefix) + len(cex_inputs)) // 2
-        sigma1 = list(cex_inputs[:h])
-        sigma2 = list(cex_inputs[h:])
+            hyp_node = self.mealy_to_basis_dict[hypothesis.states[hyp_path[-1]]]
 
-        hyp_state_p = self._get_mealy_successor(hypothesis, hypothesis.initial_state, sigma1)
-        hyp_node_p = list(self.basis_to_mealy_dict.keys())[list(self.basis_to_mealy_dict.values()).index(hyp_state_p)]
-        hyp_p_access = self.ob_tree.get_transfer_sequence(self.ob_tree.root, hyp_node_p)
+            prefix_length = len(cex_inputs)
+            for index, node in enumerate(tree_path):
+                if node in self.frontier_to_basis_dict:
+                    prefix_length = index
+                    break
 
-        witness = Apartness.compute_witness(tree_node, hyp_node, self.ob_tree)
-        if witness is None:
-            raise RuntimeError("Binary search: There should be a witness")
+            h = (prefix_length + len(cex_inputs)) // 2
+            sigma2 = cex_inputs[h:]
 
-        query_inputs = hyp_p_access + sigma2 + witness
-        query_outputs = self.sul.query(query_inputs) # LEARNING
-        self.results[0] += 1
-        self.results[1] += len(query_inputs)
+            hyp_node_p = self.mealy_to_basis_dict[hypothesis.states[hyp_path[h]]]
+            hyp_p_access = self.ob_tree.get_transfer_sequence(self.ob_tree.root, hyp_node_p)
 
-        self.ob_tree.insert_observation(query_inputs, query_outputs)
+            witness = self.witness_cache.get_or_compute(tree_node, hyp_node)
+            if witness is None:
+                raise RuntimeError("Binary search: There should be a witness")
 
-        tree_node_p = self.ob_tree.get_successor(sigma1)
+            query_inputs = list(hyp_p_access) + sigma2 + list(witness)
+            query_outputs = self._output_query(query_inputs)
 
-        witness_p = Apartness.compute_witness(tree_node_p, hyp_node_p, self.ob_tree)
+            self.ob_tree.insert_observation_unchecked(query_inputs, query_outputs)
 
-        if witness_p is not None:
-            self._process_binary_search(hypothesis, sigma1, cex_outputs[:h])
-        else:
-            new_inputs = list(hyp_p_access) + sigma2
-            self._process_binary_search(hypothesis, new_inputs, query_outputs[:len(new_inputs)])
+            tree_node_p = tree_path[h]
 
-    
-    def _get_mealy_successor(self, mealy_machine, from_state, inputs):
-        mealy_machine.current_state = from_state
-        for input in inputs:
-            mealy_machine.current_state = mealy_machine.current_state.transitions[input]
-        
-        return mealy_machine.current_state
+            witness_p = self.witness_cache.get_or_compute(tree_node_p, hyp_node_p)
+
+            if witness_p is not None:
+                cex_inputs = cex_inputs[:h]
+                cex_outputs = cex_outputs[:h]
+                del tree_path[h + 1:]
+                del hyp_path[h + 1:]
+            else:
+                cex_inputs = list(hyp_p_access) + sigma2
+                cex_outputs = query_outputs[:len(cex_inputs)]
+                tree_path = self._get_tree_path(cex_inputs)
+                hyp_path = hypothesis.get_states(cex_inputs)
+
+    def _get_tree_path(self, inputs):
+        """
+        Returns the tree nodes visited by the inputs from the root, including the root
+        """
+        node = self.ob_tree.root
+        path = [node]
+        for input_val in inputs:
+            node = node.get_successor(input_val)
+            path.append(node)
+        return path
@@ -1,12 +1,12 @@
 class Node:
-    _id_counter = 0
-
-    def __init__(self, parent=None):
-        Node._id_counter += 1
-        self.id = Node._id_counter
+    def __init__(self, node_id, parent=None):
+        self.id = node_id
         self.successors = {}
         self.parent = parent
         self.input_to_parent = None
+        self.version = 0
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.access_sequence = () if parent is None else None
 
     def __hash__(self):
         return hash(self.id)
@@ -26,18 +26,27 @@ class Node:
         if input_val in self.successors:
             return self.successors[input_val][0]
         return None
+
+    def get_access_sequence(self):
+        """ Returns the inputs leading from the root to this node, computed once and kept as a tuple """
+        if self.access_sequence is None:
+            inputs = []
+            node = self
+            while node.access_sequence is None:
+                inputs.append(node.input_to_parent)
+                node = node.parent
+            inputs.reverse()
+            self.access_sequence = node.access_sequence + tuple(inputs)
+        return self.access_sequence
     
-    def extend_and_get(self, input, output):
-        """ Extend the node with a new successor and return the successor node """
+    def extend_and_get(self, input, output, tree):
+        """ Extend the node with a new successor (numbered by the tree) and return the successor node """
         if (input in self.successors):
             out = self.successors[input][0]
             if out != output:
                 raise Exception(f"observation not consistent with tree with output from tree: {out} and output from call: {output}")
             return self.successors[input][1]
-        successor_node = Node(parent=self)
-        self.add_successor(input, output, successor_node)
-        successor_node.input_to_parent = input
-        return successor_node
+        return tree._add_successor(self, input, output)
 
 
 class ObservationTree:
@@ -45,16 +54,39 @@ class ObservationTree:
         """
         Initialize the tree with a root node and the alphabet
         """
-        self.root = Node()
-        self.alphabet = set(alphabet)
+        # every tree numbers its own nodes, the root is 1 and a new node gets the number of nodes so far plus one
+        self.size = 1
+        self.root = Node(1)
+        # the inputs in the given order, every search over the inputs follows it so runs do not depend on the hash seed
+        self.alphabet = list(dict.fromkeys(alphabet))
+        self.input_set = set(self.alphabet)
+        self.version = 0
+        # (last node, number of new nodes) of every extending insert, recorded for a checkpoint when set to a list
+        self.pending_observations = None
+
+    def get_size(self):
+        """
+        Returns the number of nodes in the tree
+        """
+        return self.size
+
+    def _add_successor(self, node, input_val, output_val):
+        """
+        Adds a new successor node with the next id below the node and returns it
+        """
+        self.size += 1
+        successor = Node(self.size, parent=node)
+        successor.input_to_parent = input_val
+        node.add_successor(input_val, output_val, successor)
+        return successor
 
     def _validate_input(self, inputs):
         """
         Check if all inputs are valid (part of the alphabet)
         """
-        for input_val in inputs:
-            if input_val not in self.alphabet:
-                raise ValueError(f"Input '{input_val}' is not in the alphabet.")
+        if not self.input_set.issuperset(inputs):
+            input_val = next(input_val for input_val in inputs if input_val not in self.input_set)
+            raise ValueError(f"Input '{input_val}' is not in the alphabet.")
 
     def insert_observation(self, inputs, outputs):
         """
@@ -64,17 +96,61 @@ class ObservationTree:
             raise ValueError("Inputs and outputs must have the same length.")
         
         self._validate_input(inputs)
+        self.insert_observation_unchecked(inputs, outputs)
 
+    def insert_observation_unchecked(self, inputs, outputs):
+        """
+        Insert an observation without validating it, for trusted callers whose inputs come from the alphabet or the
+        tree itself and whose outputs match the inputs one to one
+        """
+        nodes_before = self.size
         current_node = self.root
         for input_val, output_val in zip(inputs, outputs):
-            current_node = current_node.extend_and_get(input_val, output_val)
+            current_node = current_node.extend_and_get(input_val, output_val, self)
+
+        if self.size != nodes_before:
+            self._mark_extended(current_node)
+            if self.pending_observations is not None:
+                self.pending_observations.append((current_node, self.size - nodes_before))
+
+    def append_path(self, node, inputs, outputs):
+        """
+        Appends a chain of new nodes for the inputs and outputs below the given node, which must not have a successor
+        for the first input yet (used to replay a checkpoint). Returns the new nodes.
+        """
+        if not inputs:
+            return []
+        if node.get_successor(inputs[0]) is not None:
+            raise ValueError("The path to append already exists in the tree.")
+
+        path = []
+        for input_val, output_val in zip(inputs, outputs):
+            node = self._add_successor(node, input_val, output_val)
+            path.append(node)
+
+        self._mark_extended(node)
+        return path
+
+    def _mark_extended(self, node):
+        """
+        Stamps the node and all its ancestors with a new tree version, as their subtrees have grown
+        """
+        self.version += 1
+        while node is not None:
+            node.version = self.version
+            node = node.parent
 
     def get_observation(self, inputs):
         """
         Retrieve the list of outputs based on a given sequence of inputs
         """
         self._validate_input(inputs)
+        return self.get_observation_unchecked(inputs)
 
+    def get_observation_unchecked(self, inputs):
+        """
+        Retrieve the list of outputs without validating the inputs, for trusted callers
+        """
         current_node = self.root
         observation = []
         for input_val in inputs:
@@ -91,7 +167,12 @@ class ObservationTree:
         Retrieve the node (sub-tree) corresponding to the given sequence of inputs
         """
         self._validate_input(inputs)
+        return self.get_successor_unchecked(inputs)
 
+    def get_successor_unchecked(self, inputs):
+        """
+        Retrieve the node corresponding to the inputs without validating them, for trusted callers
+        """
         current_node = self.root
         for input_val in inputs:
             successor_node = current_node.get_successor(input_val)
@@ -103,16 +184,22 @@ class ObservationTree:
 
     def get_transfer_sequence(self, from_node, to_node):
         """
-        Get the transfer sequence (inputs) that moves from one node to another
+        Get the transfer sequence (tuple of inputs) that moves from one node to another.
+        From the root this is the cached access sequence of the node, otherwise only the depth difference is walked.
         """
+        if from_node.parent is None:
+            return to_node.get_access_sequence()
+
+        if to_node.depth < from_node.depth:
+            return None
+
         transfer_sequence = []
         current_node = to_node
-
-        while current_node != from_node:
-            if current_node.parent is None:
-                return None
+        for _ in range(to_node.depth - from_node.depth):
             transfer_sequence.append(current_node.input_to_parent)
             current_node = current_node.parent
 
+        if current_node != from_node:
+            return None
         transfer_sequence.reverse()
-        return transfer_sequence
\ No newline at end of file
+        return tuple(transfer_sequence)
@@ -0,0 +1,221 @@
+from Lsharp import Lsharp
+from ObservationTree import ObservationTree
+from CompactObservationTree import CompactObservationTree
+from Apartness import Apartness
+from ADS import Ads
+from aalpy.utils import load_automaton_from_file
+from aalpy.SULs import MealySUL
+from WMethodEqOracleMealy import WMethodEqOracleMealy
+import argparse, gc, json, os, random, sys, time, timeit, tracemalloc
+
+# Regression benchmark: learns the bundled models with fixed seeds and rule pairs, measures wall time, peak memory,
+# SUL resets and steps and tree size per model, runs micro-benchmarks of the tree, apartness and ADS code, and
+# compares everything with a stored baseline. Exits with status 1 when a metric got worse by more than its tolerance.
+#   python Lsharp/PerformanceSuite.py --quick --save    store a baseline (e.g. on the main branch)
+#   python Lsharp/PerformanceSuite.py --quick           compare the working tree with it
+folder = "Experiment Results"
+baseline_file = "performance-baseline.json"
+quick_baseline_file = "performance-baseline-quick.json"
+
+tests = [("Nothing", "SepSeq"), ("SepSeq", "SepSeq"), ("ADS", "SepSeq"), ("Nothing", "ADS"), ("SepSeq", "ADS"), ("ADS", "ADS")]
+seeds = [81, 100]
+max_learning_rounds = 75
+
+all_models = ["ASN_learnresult_SecureCode Aut_fix", "1_learnresult_MasterCard_fix", "LoesTarget", "Rabo_learnresult_SecureCode_Aut_fix",
+            "Rabo_learnresult_MAESTRO_fix", "ASN_learnresult_MAESTRO_fix", "4_learnresult_MAESTRO_fix", "10_learnresult_MasterCard_fix",
+            "Volksbank_learnresult_MAESTRO_fix", "learnresult_fix", "TCP_FreeBSD_Client", "TCP_Windows8_Client", "TCP_Linux_Client",
+            "DropBear", "OpenSSH", "TCP_Windows8_Server", "TCP_FreeBSD_Server", "TCP_Linux_Server", "BitVise",
+            "OpenSSL_1.0.2_client_regular", "OpenSSL_1.0.1j_client_regular", "RSA_BSAFE_Java_6.1.1_server_regular",
+            "miTLS_0.1.3_server_regular", "OpenSSL_1.0.2_server_regular", "NSS_3.17.4_client_regular", "GnuTLS_3.3.12_server_regular",
+            "GnuTLS_3.3.12_client_regular", "NSS_3.17.4_server_regular", "OpenSSL_1.0.1l_server_regular", "OpenSSL_1.0.1g_client_regular",
+            "RSA_BSAFE_C_4.0.4_server_regular", "OpenSSL_1.0.1j_server_regular", "GnuTLS_3.3.8_client_regular", "OpenSSL_1.0.2_client_full",
+            "GnuTLS_3.3.8_server_regular", "GnuTLS_3.3.12_server_full", "GnuTLS_3.3.12_client_full", "OpenSSL_1.0.1g_server_regular",
+            "NSS_3.17.4_client_full", "GnuTLS_3.3.8_server_full", "GnuTLS_3.3.8_client_full"]
+# banking cards, TCP, SSH and TLS models that learn in well under a minute together
+quick_models = ["LoesTarget", "ASN_learnresult_SecureCode Aut_fix", "4_learnresult_MAESTRO_fix", "learnresult_fix",
+                "TCP_Linux_Client", "DropBear", "OpenSSL_1.0.2_client_regular"]
+quick_seeds = [81]
+
+# allowed relative increase per metric before it counts as a regression, the counts are deterministic and may not grow
+tolerances = {"time": 0.25, "peak_memory": 0.10, "resets": 0.0, "steps": 0.0, "tree_size": 0.0}
+# time differences below this many seconds are treated as noise
+time_noise = 0.05
+
+# model learned once to get the observation tree for the apartness and ADS micro-benchmarks
+micro_model = "TCP_Linux_Client"
+micro_traces = 200
+micro_trace_length = 200
+
+
+def load_model(dot_file):
+    mealy_machine = load_automaton_from_file(f'Lsharp/DotFiles/{dot_file}.dot', automaton_type='mealy')
+    return mealy_machine, mealy_machine.get_input_alphabet()
+
+def learn(mealy_machine, input_al, extension_rule, separation_rule, seed):
+    """
+    Runs L# with the W-method oracle and returns the learner and the time of the run
+    """
+    sul_mealy = MealySUL(mealy_machine)
+    w_method_oracle = WMethodEqOracleMealy(input_al, sul_mealy, 2, add_to_tree=True)
+    L_sharp = Lsharp(input_al, sul_mealy, w_method_oracle, extension_rule=extension_rule, separation_rule=separation_rule,
+                     seed=seed, max_learning_rounds=max_learning_rounds)
+    # like timeit, the garbage collector does not run during the timed run
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        learned_automaton, results, learning_rounds = L_sharp.run_Lsharp()
+        execution_time = time.perf_counter() - start
+    finally:
+        gc.enable()
+    if len(learned_automaton.states) != len(mealy_machine.states):
+        raise RuntimeError(f"Learned {len(learned_automaton.states)} instead of {len(mealy_machine.states)} states "
+                           f"with {extension_rule}/{separation_rule} and seed {seed}")
+    return L_sharp, execution_time
+
+def benchmark_model(dot_file, model_seeds, repeat):
+    """
+    Returns the totals over all rule pairs and seeds of a model, with the best time of repeat runs per case.
+    The peak memory is measured in a separate run with tracemalloc, which would slow down the timed runs.
+    """
+    mealy_machine, input_al = load_model(dot_file)
+    totals = {"time": 0.0, "resets": 0, "steps": 0, "tree_size": 0}
+    for extension_rule, separation_rule in tests:
+        for seed in model_seeds:
+            L_sharp, execution_time = learn(mealy_machine, input_al, extension_rule, separation_rule, seed)
+            for _ in range(repeat - 1):
+                execution_time = min(execution_time, learn(mealy_machine, input_al, extension_rule, separation_rule, seed)[1])
+            totals["time"] += execution_time
+            totals["resets"] += L_sharp.results[0] + L_sharp.results[2]
+            totals["steps"] += L_sharp.results[1] + L_sharp.results[3]
+            totals["tree_size"] += L_sharp.results[4]
+
+    extension_rule, separation_rule = tests[-1]
+    tracemalloc.start()
+    learn(mealy_machine, input_al, extension_rule, separation_rule, model_seeds[0])
+    totals["peak_memory"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return totals
+
+def time_call(function, repeat=5):
+    """
+    Returns the best time of one call in seconds, each repetition runs as many calls as fit in about 0.2 seconds
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def micro_benchmarks():
+    """
+    Returns the time of one call of every micro-benchmark
+    """
+    mealy_machine, input_al = load_model(micro_model)
+    sul_mealy = MealySUL(mealy_machine)
+    random.seed(1)
+    traces = []
+    for _ in range(micro_traces):
+        inputs = tuple(random.choice(input_al) for _ in range(micro_trace_length))
+        traces.append((inputs, sul_mealy.query(inputs)))
+
+    def insert_traces(tree_class):
+        ob_tree = tree_class(input_al)
+        for inputs, outputs in traces:
+            ob_tree.insert_observation(inputs, outputs)
+
+    L_sharp, _ = learn(mealy_machine, input_al, "ADS", "ADS", 81)
+    ob_tree = L_sharp.ob_tree
+    basis = sorted(L_sharp.basis, key=lambda node: node.id)
+    frontier = sorted(L_sharp.frontier_to_basis_dict, key=lambda node: node.id)
+    first_states = [frontier_state for frontier_state in frontier for _ in basis]
+    second_states = [basis_state for _ in frontier for basis_state in basis]
+
+    return {
+        "tree_insert": time_call(lambda: insert_traces(ObservationTree)),
+        "compact_tree_insert": time_call(lambda: insert_traces(CompactObservationTree)),
+        "apartness": time_call(lambda: [Apartness.states_are_apart(first, second, ob_tree) for first, second in zip(first_states, second_states)]),
+        "witness": time_call(lambda: [Apartness.compute_witness(first, second, ob_tree) for first, second in zip(first_states, second_states)]),
+        "ads_construction": time_call(lambda: Ads(ob_tree, set(basis))),
+    }
+
+def compare(metric, baseline_value, value):
+    """
+    Returns the status of a metric compared with the baseline: ok, improved or REGRESSION
+    """
+    tolerance = tolerances["time" if metric.startswith("micro") else metric]
+    difference = value - baseline_value
+    if metric == "time" or metric.startswith("micro"):
+        noise = time_noise if metric == "time" else 0.0
+        if abs(difference) <= noise:
+            return "ok"
+    if difference > tolerance * baseline_value:
+        return "REGRESSION"
+    if difference < -tolerance * baseline_value:
+        return "improved"
+    return "ok"
+
+def report(baseline, current):
+    """
+    Prints every metric next to its baseline value and returns the number of regressions
+    """
+    rows = []
+    for model, metrics in current["models"].items():
+        for metric, value in metrics.items():
+            baseline_value = baseline["models"].get(model, {}).get(metric)
+            rows.append((model, metric, baseline_value, value))
+    for name, value in current["micro"].items():
+        rows.append(("micro", f"micro {name}", baseline["micro"].get(name), value))
+
+    regressions = 0
+    print(f"{'model':40} {'metric':24} {'baseline':>14} {'current':>14} {'change':>8}  status")
+    for model, metric, baseline_value, value in rows:
+        if baseline_value is None:
+            status, change = "new", ""
+        else:
+            status = compare(metric, baseline_value, value)
+            change = f"{(value - baseline_value) / baseline_value:+.1%}" if baseline_value else ""
+        regressions += status == "REGRESSION"
+        print(f"{model:40} {metric:24} {format_value(baseline_value):>14} {format_value(value):>14} {change:>8}  {status}")
+    return regressions
+
+def format_value(value):
+    if value is None:
+        return ""
+    return f"{value:.6g}" if isinstance(value, float) else str(value)
+
+def main():
+    parser = argparse.ArgumentParser(description="L# regression benchmark")
+    parser.add_argument("--quick", action="store_true", help="run the quick subset of models and seeds")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline instead of comparing")
+    parser.add_argument("--baseline", help="baseline file, by default one for the quick and one for the full suite")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case of which the best time counts, more runs give steadier times")
+    parser.add_argument("--models", help="comma separated models to run instead of the default set")
+    args = parser.parse_args()
+
+    models = args.models.split(",") if args.models else quick_models if args.quick else all_models
+    model_seeds = quick_seeds if args.quick else seeds
+    baseline_path = args.baseline or os.path.join(folder, quick_baseline_file if args.quick else baseline_file)
+
+    start = time.perf_counter()
+    current = {"settings": {"models": models, "seeds": model_seeds, "tests": tests, "repeat": args.repeat}, "models": {}, "micro": {}}
+    for dot_file in models:
+        current["models"][dot_file] = benchmark_model(dot_file, model_seeds, args.repeat)
+        print(f"{dot_file}: {current['models'][dot_file]['time']:.2f}s", flush=True)
+    current["micro"] = micro_benchmarks()
+    print(f"Suite ran in {time.perf_counter() - start:.1f}s\n")
+
+    if args.save or not os.path.exists(baseline_path):
+        with open(baseline_path, mode="w") as file:
+            json.dump(current, file, indent=2)
+        print(f"Baseline stored in {baseline_path}")
+        return 0
+
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    if baseline["settings"]["seeds"] != model_seeds or [list(test) for test in tests] != baseline["settings"]["tests"]:
+        print(f"Warning: {baseline_path} was made with other seeds or rule pairs, the counts are not comparable")
+    regressions = report(baseline, current)
+    print(f"\n{regressions} regression(s) compared with {baseline_path}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import csv
+from time import perf_counter
+
+class LearningProfiler:
+    """
+    Per-phase timers and call counts of an L# learner, collected into one record per learning round together with the
+    tree growth, the basis and frontier sizes, the query counts and the cache hit rates of that round.
+    The profiler replaces the methods of each phase on the learner (and on its apartness and witness cache objects)
+    by timed wrappers, so a learner without a profiler runs the plain methods. Times are exclusive: a phase running
+    inside another one (e.g. a witness computed while processing a counterexample) only counts for the inner phase,
+    and time outside all phases counts as "other", so the phase times of a round add up to its total time.
+    """
+    phases = ["hypothesis", "apartness", "ads", "witness", "counterexample", "sul", "oracle", "other"]
+
+    def __init__(self, learner):
+        self.learner = learner
+        self.records = []
+        self.wrapped = []
+        for phase, owner, name in self._timed_methods(learner):
+            setattr(owner, name, self._wrap(phase, getattr(owner, name)))
+            self.wrapped.append((owner, name))
+        self.start()
+
+    @staticmethod
+    def _timed_methods(learner):
+        """
+        Returns the (phase, object, method name) of every method that is timed
+        """
+        return [
+            ("hypothesis", learner, "_construct_hypothesis"),
+            ("apartness", learner, "_find_tree_conflict"),
+            ("apartness", learner.apartness, "find_candidates"),
+            ("apartness", learner.apartness, "update_candidates"),
+            ("apartness", learner.apartness, "update_all_candidates"),
+            ("apartness", learner.apartness, "add_basis_state"),
+            ("ads", learner, "_construct_ads"),
+            ("witness", learner.witness_cache, "get_or_compute"),
+            ("counterexample", learner, "_process_counter_example"),
+            ("sul", learner, "_run_scheduled_queries"),
+            ("sul", learner, "_sul_adaptive_query"),
+            ("sul", learner, "_output_query"),
+            ("oracle", learner, "_find_counter_example"),
+        ]
+
+    def _wrap(self, phase, method):
+        def timed(*args, **kwargs):
+            self._enter(phase)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._exit()
+        return timed
+
+    def _enter(self, phase):
+        now = perf_counter()
+        self.times[self.stack[-1]] += now - self.last
+        self.last = now
+        self.stack.append(phase)
+        self.calls[phase] += 1
+
+    def _exit(self):
+        now = perf_counter()
+        self.times[self.stack.pop()] += now - self.last
+        self.last = now
+
+    def start(self):
+        """
+        Starts the clock of the first learning round, called by run_Lsharp
+        """
+        self.times = dict.fromkeys(self.phases, 0.0)
+        self.calls = dict.fromkeys(self.phases, 0)
+        self.stack = ["other"]
+        self.round_start = self.last = perf_counter()
+        self.previous_size = self.learner.ob_tree.get_size()
+        self.previous_hits = {}
+
+    def end_round(self, learning_round):
+        """
+        Stores the record of the learning round that just finished and starts the clock of the next one
+        """
+        now = perf_counter()
+        self.times[self.stack[-1]] += now - self.last
+        self.last = now
+
+        learner = self.learner
+        tree_size = learner.ob_tree.get_size()
+        record = {
+            "round": learning_round,
+            "time": now - self.round_start,
+            "tree_size": tree_size,
+            "tree_growth": tree_size - self.previous_size,
+            "basis_size": len(learner.basis),
+            "frontier_size": len(learner.frontier_to_basis_dict),
+            "learn_resets": learner.results[0],
+            "learn_steps": learner.results[1],
+            "test_resets": learner.results[2],
+            "test_steps": learner.results[3],
+            "witness_cache_hit_rate": self._round_hit_rate("witness", learner.witness_cache),
+            "ads_cache_hit_rate": self._round_hit_rate("ads", learner.ads_cache),
+            # only a CachedSUL counts hits and misses
+            "query_cache_hit_rate": self._round_hit_rate("query", learner.sul) if hasattr(learner.sul, "hits") else None,
+        }
+        for phase in self.phases:
+            record[f"{phase}_time"] = self.times[phase]
+            record[f"{phase}_calls"] = self.calls[phase]
+        self.records.append(record)
+
+        self.times = dict.fromkeys(self.phases, 0.0)
+        self.calls = dict.fromkeys(self.phases, 0)
+        self.round_start = now
+        self.previous_size = tree_size
+
+    def _round_hit_rate(self, name, cache):
+        """
+        Returns the fraction of the lookups of this round that were hits, or None if there were none
+        """
+        previous_hits, previous_misses = self.previous_hits.get(name, (0, 0))
+        hits = cache.hits - previous_hits
+        misses = cache.misses - previous_misses
+        self.previous_hits[name] = (cache.hits, cache.misses)
+        return hits / (hits + misses) if hits + misses else None
+
+    def get_totals(self):
+        """
+        Returns the total time and number of calls of every phase over all recorded rounds
+        """
+        return {
+            phase: (sum(record[f"{phase}_time"] for record in self.records), sum(record[f"{phase}_calls"] for record in self.records))
+            for phase in self.phases
+        }
+
+    def export_csv(self, path, extra_columns=None):
+        """
+        Writes the round records to a CSV file, extra_columns (e.g. the model and seed) are added to every row
+        """
+        extra_columns = extra_columns or {}
+        with open(path, mode="w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=list(extra_columns) + self.get_fields())
+            writer.writeheader()
+            for record in self.records:
+                writer.writerow({**extra_columns, **record})
+
+    def get_fields(self):
+        """
+        Returns the keys of a round record in order
+        """
+        return ["round", "time", "tree_size", "tree_growth", "basis_size", "frontier_size", "learn_resets", "learn_steps",
+                "test_resets", "test_steps", "witness_cache_hit_rate", "ads_cache_hit_rate", "query_cache_hit_rate"] + \
+               [f"{phase}_{counter}" for phase in self.phases for counter in ("time", "calls")]
+
+    def remove(self):
+        """
+        Restores the plain methods, after which the learner runs without any profiling
+        """
+        for owner, name in self.wrapped:
+            delattr(owner, name)
+        self.wrapped = []
+        if self.learner.profiler is self:
+            self.learner.profiler = None
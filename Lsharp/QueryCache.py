@@ -0,0 +1,192 @@
+import pickle
+import sqlite3
+from threading import Lock
+
+from aalpy.base import SUL
+
+class QueryCache:
+    """
+    Persistent store of output queries in a SQLite file, shared by learning runs (and processes) on the same models.
+    Every input sequence is stored under a text key in which each input is terminated by a separator, so the key of
+    a prefix is a prefix of the key and all stored extensions of a sequence are found with one range scan.
+    One cache can be shared by the SULs of several threads (e.g. the worker SULs of the W-method oracle).
+    """
+    _separator = '\x1f'
+    _key_limit = '\U0010ffff'
+
+    def __init__(self, path, commit_interval=100):
+        """
+        Args:
+
+            path: SQLite file, created when it does not exist
+            commit_interval: number of stored queries after which they are committed to disk, a pending commit
+                             blocks other processes writing to the same file
+        """
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS queries (model TEXT, inputs TEXT, outputs BLOB, PRIMARY KEY (model, inputs))"
+        )
+        self.connection.commit()
+        self.commit_interval = commit_interval
+        self.uncommitted = 0
+
+    @staticmethod
+    def encode_input(input_val):
+        """
+        Returns the key part of a single input (repr escapes the separator inside the input itself)
+        """
+        return repr(input_val) + QueryCache._separator
+
+    @staticmethod
+    def encode_inputs(inputs):
+        """
+        Returns the key of an input sequence
+        """
+        return "".join(QueryCache.encode_input(input_val) for input_val in inputs)
+
+    def find_extension(self, model, key):
+        """
+        Returns (key, outputs) of a stored sequence that starts with the given key, or None
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT inputs, outputs FROM queries WHERE model = ? AND inputs >= ? AND inputs < ? LIMIT 1",
+                (model, key, key + self._key_limit)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], pickle.loads(row[1])
+
+    def get(self, model, inputs):
+        """
+        Returns the outputs of the input sequence if it (or an extension of it) is stored, otherwise None
+        """
+        match = self.find_extension(model, self.encode_inputs(inputs))
+        if match is None:
+            return None
+        return match[1][:len(inputs)]
+
+    def put(self, model, inputs, outputs):
+        """
+        Stores the outputs of an input sequence
+        """
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO queries VALUES (?, ?, ?)",
+                (model, self.encode_inputs(inputs), pickle.dumps(list(outputs)))
+            )
+            self.uncommitted += 1
+            if self.uncommitted >= self.commit_interval:
+                self.connection.commit()
+                self.uncommitted = 0
+
+    def commit(self):
+        """
+        Writes the stored queries to disk
+        """
+        with self.lock:
+            self.connection.commit()
+            self.uncommitted = 0
+
+    def close(self):
+        """
+        Commits and closes the database
+        """
+        self.commit()
+        self.connection.close()
+
+
+class CachedSUL(SUL):
+    """
+    SUL wrapper that answers queries from a QueryCache and only runs the wrapped SUL on a miss.
+    num_queries and num_steps count every query posed (like any SUL), hits and misses count the queries answered
+    from the cache and by the SUL, and sul_queries and sul_steps count what was actually executed on the SUL.
+    Step-wise use (pre, step, post) is answered from the cache as long as the inputs so far are stored, the first
+    unknown input resets the SUL and replays the inputs before it.
+    """
+    def __init__(self, sul, query_cache, model):
+        """
+        Args:
+
+            sul: system under learning to wrap
+            query_cache: QueryCache holding the stored queries
+            model: name under which the queries of this system are stored (e.g. the dot file)
+        """
+        super().__init__()
+        self.sul = sul
+        self.query_cache = query_cache
+        self.model = model
+        if hasattr(sul, "automaton"):
+            self.automaton = sul.automaton
+        self.hits = 0
+        self.misses = 0
+        self.sul_queries = 0
+        self.sul_steps = 0
+        self._reset_session()
+
+    def _reset_session(self):
+        self.session_inputs = []
+        self.session_outputs = []
+        self.session_key = ""
+        self.session_match = None
+        self.sul_running = False
+
+    def query(self, word):
+        outputs = self.query_cache.get(self.model, word)
+        self.num_queries += 1
+        self.num_steps += len(word)
+        if outputs is not None:
+            self.hits += 1
+            return outputs
+
+        self.misses += 1
+        outputs = self.sul.query(word)
+        self.sul_queries += 1
+        self.sul_steps += len(word)
+        self.query_cache.put(self.model, word, outputs)
+        return outputs
+
+    def pre(self):
+        self.post()
+
+    def post(self):
+        if self.sul_running:
+            self.sul.post()
+            self.query_cache.put(self.model, self.session_inputs, self.session_outputs)
+            self.misses += 1
+        elif self.session_inputs:
+            self.hits += 1
+        self._reset_session()
+
+    def step(self, letter):
+        self.session_inputs.append(letter)
+        if not self.sul_running:
+            self.session_key += QueryCache.encode_input(letter)
+            if self.session_match is None or not self.session_match[0].startswith(self.session_key):
+                self.session_match = self.query_cache.find_extension(self.model, self.session_key)
+
+            if self.session_match is not None:
+                output = self.session_match[1][len(self.session_inputs) - 1]
+                self.session_outputs.append(output)
+                return output
+
+            self.sul_running = True
+            self.sul.pre()
+            self.sul_queries += 1
+            for input_val in self.session_inputs[:-1]:
+                self.sul.step(input_val)
+            self.sul_steps += len(self.session_inputs) - 1
+
+        output = self.sul.step(letter)
+        self.sul_steps += 1
+        self.session_outputs.append(output)
+        return output
+
+    def close(self):
+        """
+        Finishes a running query and writes the cache to disk
+        """
+        self.post()
+        self.query_cache.commit()
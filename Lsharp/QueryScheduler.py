@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from queue import Queue
+
+class SerialQueryExecutor:
+    """
+    Runs the queries one after the other on a single SUL
+    """
+    def __init__(self, sul):
+        self.sul = sul
+
+    def run(self, queries):
+        """ Returns the outputs of the SUL for every query """
+        return [self.sul.query(query) for query in queries]
+
+    def close(self):
+        """ Nothing to release """
+        pass
+
+
+class ThreadPoolQueryExecutor:
+    """
+    Runs the queries concurrently with one thread per SUL instance, useful when the SUL waits on I/O
+    """
+    def __init__(self, suls):
+        self.free_suls = Queue()
+        for sul in suls:
+            self.free_suls.put(sul)
+        self.pool = ThreadPoolExecutor(max_workers=len(suls))
+
+    def _query(self, query):
+        sul = self.free_suls.get()
+        try:
+            return sul.query(query)
+        finally:
+            self.free_suls.put(sul)
+
+    def run(self, queries):
+        """ Returns the outputs of the SULs for every query, in the order of the queries """
+        return list(self.pool.map(self._query, queries))
+
+    def close(self):
+        """ Stops the worker threads """
+        self.pool.shutdown()
+
+
+_worker_sul = None
+
+def _init_worker(sul):
+    global _worker_sul
+    _worker_sul = sul
+
+def _query_worker_sul(query):
+    return _worker_sul.query(query)
+
+
+class ProcessPoolQueryExecutor:
+    """
+    Runs the queries concurrently in worker processes, each owning a copy of the (picklable) SUL
+    """
+    def __init__(self, sul, num_workers):
+        self.pool = ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker, initargs=(sul,))
+        self.num_workers = num_workers
+
+    def run(self, queries):
+        """ Returns the outputs of the SULs for every query, in the order of the queries """
+        chunk_size = max(1, len(queries) // (4 * self.num_workers))
+        return list(self.pool.map(_query_worker_sul, queries, chunksize=chunk_size))
+
+    def close(self):
+        """ Stops the worker processes """
+        self.pool.shutdown()
+
+
+class QueryScheduler:
+    def __init__(self, ob_tree, executor):
+        """
+        Collects independent output queries and runs them as one batch through the executor.
+        Duplicates, queries answered by the tree and queries that are a prefix of another query are not sent.
+        Adaptive queries are only collected for executors that can run them in a batch (run_adaptive), the learner
+        sends them one at a time otherwise.
+        """
+        self.ob_tree = ob_tree
+        self.executor = executor
+        self.pending = []
+        self.pending_adaptive = []
+        self.batches_adaptive_queries = hasattr(executor, "run_adaptive")
+
+    def add(self, inputs):
+        """
+        Schedules an output query
+        """
+        self.pending.append(tuple(inputs))
+
+    def add_adaptive(self, inputs, ads):
+        """
+        Schedules an adaptive output query, the ADS chooses the inputs after the given inputs
+        """
+        self.pending_adaptive.append((tuple(inputs), ads))
+
+    def run(self):
+        """
+        Runs all scheduled queries and inserts the results into the tree in the order in which they were added,
+        followed by the scheduled adaptive queries. Returns the number of queries and steps that were sent to the SUL.
+        """
+        num_queries, num_steps = self._run_queries()
+
+        adaptive_queries, self.pending_adaptive = self.pending_adaptive, []
+        if adaptive_queries:
+            for inputs, outputs in self.executor.run_adaptive(adaptive_queries):
+                self.ob_tree.insert_observation_unchecked(inputs, outputs)
+                num_steps += len(outputs)
+            num_queries += len(adaptive_queries)
+
+        return num_queries, num_steps
+
+    def _run_queries(self):
+        """
+        Runs the scheduled output queries that are not answered by the tree or by another query
+        """
+        queries, self.pending = self.pending, []
+
+        prefix_trie = {}
+        unique_queries = []
+        for query in dict.fromkeys(queries):
+            if self.ob_tree.get_observation_unchecked(query) is not None:
+                continue
+            unique_queries.append(query)
+            node = prefix_trie
+            for input_val in query:
+                node = node.setdefault(input_val, {})
+
+        to_send = []
+        for query in unique_queries:
+            node = prefix_trie
+            for input_val in query:
+                node = node[input_val]
+            if not node:
+                to_send.append(query)
+
+        if not to_send:
+            return 0, 0
+
+        outputs = self.executor.run(to_send)
+        for inputs, query_outputs in zip(to_send, outputs):
+            self.ob_tree.insert_observation_unchecked(inputs, query_outputs)
+
+        return len(to_send), sum(len(query) for query in to_send)
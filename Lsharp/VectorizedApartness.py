@@ -0,0 +1,88 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from CompactObservationTree import CompactObservationTree, CompactNode
+
+class VectorizedApartness:
+    @staticmethod
+    def supports(ob_tree):
+        """
+        Checks if the vectorized kernel can be used for the tree (a CompactObservationTree with NumPy installed)
+        """
+        return np is not None and isinstance(ob_tree, CompactObservationTree)
+
+    @staticmethod
+    def find_conflicts(first_states, second_states, ob_tree):
+        """
+        Checks many pairs of states for apartness at once, by walking all pairs level by level with NumPy index arrays.
+        Returns for each pair the first node in the subtree of the first state at which the outputs differ, or None.
+        """
+        alphabet_size = ob_tree.alphabet_size
+        successors = np.frombuffer(ob_tree.successors, dtype=np.int32).reshape(-1, alphabet_size)
+        outputs = np.frombuffer(ob_tree.outputs, dtype=np.int32)
+
+        first_nodes = np.fromiter((state.id for state in first_states), dtype=np.int32)
+        second_nodes = np.fromiter((state.id for state in second_states), dtype=np.int32)
+        pair_ids = np.arange(len(first_nodes))
+        conflicts = np.full(len(first_nodes), -1, dtype=np.int32)
+
+        while len(pair_ids):
+            first_successors = successors[first_nodes]
+            second_successors = successors[second_nodes]
+            both_defined = (first_successors >= 0) & (second_successors >= 0)
+            differ = both_defined & (outputs[first_successors] != outputs[second_successors])
+
+            apart_rows = np.flatnonzero(differ.any(axis=1))
+            if len(apart_rows):
+                # several node pairs of the same state pair can differ on this level, keep the first one found
+                apart_pairs, first_rows = np.unique(pair_ids[apart_rows], return_index=True)
+                apart_rows = apart_rows[first_rows]
+                first_inputs = differ[apart_rows].argmax(axis=1)
+                conflicts[apart_pairs] = first_successors[apart_rows, first_inputs]
+                both_defined[np.isin(pair_ids, apart_pairs)] = False
+
+            rows, inputs = np.nonzero(both_defined)
+            first_nodes = first_successors[rows, inputs]
+            second_nodes = second_successors[rows, inputs]
+            pair_ids = pair_ids[rows]
+
+        return [CompactNode(ob_tree, conflict) if conflict >= 0 else None for conflict in conflicts.tolist()]
+
+    @staticmethod
+    def find_hypothesis_conflict(ob_tree, hypothesis):
+        """
+        Walks the tree and the compiled hypothesis together level by level, comparing the outputs of all tree nodes
+        on a level with their hypothesis states at once. Returns the first tree node whose output differs, or None.
+        The inputs are visited in the order of ob_tree.alphabet, so the result matches the breadth-first search.
+        """
+        alphabet_size = ob_tree.alphabet_size
+        successors = np.frombuffer(ob_tree.successors, dtype=np.int32).reshape(-1, alphabet_size)
+        outputs = np.frombuffer(ob_tree.outputs, dtype=np.int32)
+        hyp_transitions = np.array(hypothesis.transitions, dtype=np.int32)
+        hyp_outputs = np.array(hypothesis.outputs, dtype=np.int32)
+        # tree output codes to hypothesis output codes (-1 if unknown), the trailing -1 covers the output code of the root
+        tree_inputs = np.array([ob_tree.input_index[input_val] for input_val in ob_tree.alphabet], dtype=np.int32)
+        hyp_inputs = np.array([hypothesis.input_index[input_val] for input_val in ob_tree.alphabet], dtype=np.int32)
+        output_map = np.array([hypothesis.output_index.get(output_val, -1) for output_val in ob_tree.output_values] + [-1], dtype=np.int32)
+        none_output = hypothesis.output_index.get(None, -1)
+
+        tree_nodes = np.zeros(1, dtype=np.int32)
+        hyp_states = np.full(1, hypothesis.initial_state, dtype=np.int32)
+        while len(tree_nodes):
+            tree_successors = successors[tree_nodes[:, None], tree_inputs[None, :]]
+            slots = hyp_states[:, None] * hypothesis.alphabet_size + hyp_inputs[None, :]
+            hyp_level_outputs = hyp_outputs[slots]
+            defined = (tree_successors >= 0) & (hyp_level_outputs != none_output)
+            differ = defined & (output_map[outputs[tree_successors]] != hyp_level_outputs)
+
+            if differ.any():
+                row, input_code = np.unravel_index(differ.argmax(), differ.shape)
+                return CompactNode(ob_tree, int(tree_successors[row, input_code]))
+
+            rows, inputs = np.nonzero(defined)
+            tree_nodes = tree_successors[rows, inputs]
+            hyp_states = hyp_transitions[slots[rows, inputs]]
+
+        return None
@@ -1,117 +1,346 @@
-import copy
+from itertools import islice
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
 
-from itertools import product
-from random import shuffle, seed
+from IndexPermutation import IndexPermutation
+from Apartness import Apartness
+from CompiledHypothesis import CompiledHypothesis
 
 from aalpy.base.Oracle import Oracle
 from aalpy.base.SUL import SUL
 
 
+_UNOBSERVED = object()
+
+class _TestTrieNode:
+    __slots__ = ['children', 'expected', 'observed', 'snapshot']
+
+    def __init__(self, expected=None):
+        self.children = {}
+        self.expected = expected
+        self.observed = _UNOBSERVED
+        self.snapshot = None
+
+    def get_node(self, inputs):
+        """ Returns the node reached by the inputs """
+        node = self
+        for letter in inputs:
+            node = node.children[letter]
+        return node
+
+    def get_outputs(self, inputs):
+        """
+        Returns the observed outputs along the inputs and the index of the first output differing from the expected
+        output (or None), the outputs are None when part of the inputs has not been executed yet
+        """
+        node = self
+        outputs = []
+        for ind, letter in enumerate(inputs):
+            node = node.children[letter]
+            if node.observed is _UNOBSERVED:
+                return None, None
+            outputs.append(node.observed)
+            if node.observed != node.expected:
+                return outputs, ind
+        return outputs, None
+
+    def get_deepest_snapshot(self, inputs):
+        """ Returns the depth and node of the deepest node with a sul snapshot along the inputs """
+        deepest = (0, self)
+        node = self
+        for depth, letter in enumerate(inputs, 1):
+            node = node.children[letter]
+            if node.observed is _UNOBSERVED:
+                break
+            if node.snapshot is not None:
+                deepest = (depth, node)
+        return deepest
+
+
 class WMethodEqOracleMealy(Oracle):
     """
     Equivalence oracle based on characterization set/ W-set. From 'Tsun S. Chow.   Testing software design modeled by
     finite-state machines'.
     """
-    def __init__(self, alphabet: list, sul: SUL, extra_states, add_to_tree=False):
+    def __init__(self, alphabet: list, sul: SUL, extra_states, add_to_tree=False, worker_suls=None, chunk_size=256):
         """
         Args:
 
             alphabet: input alphabet
             sul: system under learning
             max_number_of_states: maximum number of states in the automaton
+            worker_suls: separate SUL instances, when given the tests are divided over one worker thread per SUL
+            chunk_size: number of consecutive tests that are merged into one test trie (and taken at once by a worker)
         """
         super().__init__(alphabet, sul)
         self.k = extra_states
         self.cache = set()
         self.add_to_tree = add_to_tree
+        self.worker_suls = worker_suls
+        self.chunk_size = chunk_size
         self.num_steps = 0
         self.resets = 0
+        self.characterization_set = []
+
+    def find_cex(self, hypothesis, ob_tree=None, shuffle_seed=None, witnesses=None, compiled_hypothesis=None):
+        """
+        Returns a counterexample to the hypothesis, or None if all tests pass.
+        witnesses: separating sequences the learner already knows, a dict from pairs of hypothesis states to a
+                   sequence on which they differ, used before computing new ones
+        compiled_hypothesis: the hypothesis compiled to a CompiledHypothesis, if the caller keeps one up to date
+        """
+        if compiled_hypothesis is None:
+            compiled_hypothesis = CompiledHypothesis(hypothesis, self.alphabet)
+        if ob_tree is not None:
+            # outputs already in the tree are checked without any sul cost
+            counter_example = Apartness.compute_witness_in_tree_and_hypothesis(ob_tree, compiled_hypothesis)
+            if counter_example:
+                return tuple(counter_example)
+
+        state_witnesses = self._get_state_witnesses(compiled_hypothesis, witnesses)
+        test_suite = self._generate_test_suite(hypothesis, compiled_hypothesis, ob_tree, shuffle_seed, state_witnesses)
+
+        if self.worker_suls:
+            return self._find_cex_parallel(compiled_hypothesis, test_suite, ob_tree)
 
-    def find_cex(self, hypothesis, ob_tree=None, shuffle_seed=None):
+        numbered_tests = enumerate(test_suite)
+        while True:
+            chunk = list(islice(numbered_tests, self.chunk_size))
+            if not chunk:
+                return None
+
+            passed_tests, failure, resets, steps = self._run_chunk(self.sul, compiled_hypothesis, ob_tree, chunk, lambda: float("inf"))
+            self.resets += resets
+            self.num_steps += steps
+            for _, inp_seq, outputs in passed_tests:
+                if self.add_to_tree:
+                    ob_tree.insert_observation_unchecked(inp_seq, outputs)
+                self.cache.add(inp_seq)
+
+            if failure is not None:
+                return failure[1]
+
+    def _get_state_witnesses(self, hypothesis, witnesses):
+        """
+        Returns the witnesses as a dict from pairs of state ids (smallest first) of the compiled hypothesis
+        """
+        state_witnesses = {}
+        for (state_one, state_two), witness in (witnesses or {}).items():
+            pair = (hypothesis.state_index[state_one], hypothesis.state_index[state_two])
+            state_witnesses[(min(pair), max(pair))] = tuple(witness)
+        return state_witnesses
+
+    def _generate_test_suite(self, hypothesis, compiled_hypothesis, ob_tree, shuffle_seed, witnesses):
+        """
+        Returns the (lazy) test suite for the hypothesis: transition cover x middle x characterization set
+        """
         if not hypothesis.characterization_set:
             if len(hypothesis.states) == 1:
                 hypothesis.characterization_set = [(a,) for a in self.alphabet]
             else:
-                hypothesis.characterization_set = self.compute_characterization_set(hypothesis)
+                hypothesis.characterization_set = self._update_characterization_set(compiled_hypothesis, witnesses)
 
         shortest_paths = {state: hypothesis.get_shortest_path(hypothesis.initial_state, state) for state in hypothesis.states}
         transition_cover = [shortest_paths[state] + (letter,) for state in hypothesis.states for letter in self.alphabet]
-        middle = (seq for i in range(self.k + 1) for seq in product(self.alphabet, repeat=i))
-
-        test_suite = list(product(transition_cover, middle, hypothesis.characterization_set))
-
-        if shuffle_seed is not None:
-            seed(shuffle_seed)
-        shuffle(test_suite)
-
-        for seq in test_suite:
-            inp_seq = tuple([i for sub in seq for i in sub])
-            if inp_seq not in self.cache:
-                self.reset_hyp_and_sul(hypothesis)
-                self.resets += 1
-                outputs = []
-                for ind, letter in enumerate(inp_seq):
-                    out_hyp = hypothesis.step(letter)
-                    out_sul = self.sul.step(letter)
-                    self.num_steps += 1
-                    outputs.append(out_sul)
-                    if out_hyp != out_sul:
-                        self.sul.post()
-                        return inp_seq[:ind + 1]
-                
-                if self.add_to_tree:
-                    ob_tree.insert_observation(inp_seq, outputs)
-                self.cache.add(inp_seq)
 
-        return None
+        return self._generate_tests(transition_cover, hypothesis.characterization_set, shuffle_seed)
+
+    def _generate_tests(self, transition_cover, characterization_set, shuffle_seed):
+        """
+        Lazily yields the tests of transition cover x middle x characterization set in a seeded pseudo-random order.
+        Every position of a permutation of the index space is decoded as mixed-radix number
+        (transition, middle part, suffix), so memory stays constant whatever the size of the test suite.
+        """
+        alphabet = list(self.alphabet)
+        num_middle = sum(len(alphabet) ** i for i in range(self.k + 1))
+        num_suffixes = len(characterization_set)
+
+        for index in IndexPermutation(len(transition_cover) * num_middle * num_suffixes, shuffle_seed):
+            index, suffix_index = divmod(index, num_suffixes)
+            transition_index, middle_index = divmod(index, num_middle)
+            yield transition_cover[transition_index] + self._get_middle(alphabet, middle_index) + tuple(characterization_set[suffix_index])
+
+    def _get_middle(self, alphabet, index):
+        """
+        Returns the middle part with the given index, in the order of all sequences of length 0 up to k
+        """
+        length = 0
+        num_sequences = 1
+        while index >= num_sequences:
+            index -= num_sequences
+            length += 1
+            num_sequences *= len(alphabet)
+
+        middle = []
+        for _ in range(length):
+            index, letter_index = divmod(index, len(alphabet))
+            middle.append(alphabet[letter_index])
+        middle.reverse()
+        return tuple(middle)
+
+    def _find_cex_parallel(self, hypothesis, test_suite, ob_tree):
+        """
+        Runs the test suite on the worker SULs in chunks of consecutive tests. As soon as a test fails, chunks
+        after it are cancelled, while chunks before it are still completed, so the counterexample is the one of
+        the lowest failing test, the same as when running the tests one by one.
+        """
+        lock = Lock()
+        numbered_tests = enumerate(test_suite)
+        passed_tests = []
+        failure = {"index": float("inf"), "cex": None}
+
+        def worker(sul):
+            resets = 0
+            steps = 0
+            while True:
+                with lock:
+                    chunk = list(islice(numbered_tests, self.chunk_size))
+                if not chunk or chunk[0][0] > failure["index"]:
+                    break
+                chunk_passed, chunk_failure, chunk_resets, chunk_steps = self._run_chunk(sul, hypothesis, ob_tree, chunk, lambda: failure["index"])
+                resets += chunk_resets
+                steps += chunk_steps
+                with lock:
+                    passed_tests.extend(chunk_passed)
+                    if chunk_failure is not None and chunk_failure[0] < failure["index"]:
+                        failure["index"], failure["cex"] = chunk_failure
+            with lock:
+                self.resets += resets
+                self.num_steps += steps
+
+        with ThreadPoolExecutor(max_workers=len(self.worker_suls)) as pool:
+            list(pool.map(worker, self.worker_suls))
+
+        passed_tests.sort(key=lambda test: test[0])
+        for index, inp_seq, outputs in passed_tests:
+            if index > failure["index"]:
+                break
+            if self.add_to_tree:
+                ob_tree.insert_observation_unchecked(inp_seq, outputs)
+            self.cache.add(inp_seq)
+
+        return failure["cex"]
 
-    def compute_characterization_set(self, hypothesis, char_set_init=None, online_suffix_closure=True, split_all_blocks=True, raise_warning=True):
+    def _run_chunk(self, sul, hypothesis, ob_tree, chunk, failure_bound):
         """
-        Computation of a characterization set, that is, a set of sequences that can distinguish all states in the
-        automation. This implementation is based on the aalpy implementation but is made compatible for a Mealy machien
+        Runs a chunk of numbered tests in the order of their numbers, stopping at the first failing test or when the
+        numbers pass failure_bound(). The expected outputs of the whole chunk are simulated at once on the compiled
+        hypothesis, and the tests are merged into a trie holding the expected (hypothesis) output and,
+        once executed, the observed (sul) output of every transition, so a test that is a prefix of an executed
+        sequence is answered without running it. A test that is not answered yet is run extended to a leaf of the trie,
+        covering the tests it is a prefix of. If the sul offers snapshot() and restore(snapshot), a run starts from the
+        deepest snapshot on its path instead of resetting the sul. Outputs known in the observation tree are filled
+        in up front, so tests covered by the tree cost no resets at all.
+        Returns the passed tests with their outputs, the (number, counterexample) of the failing test or None, and
+        the number of resets and steps used.
         """
-        blocks = list()
-        blocks.append(copy.copy(hypothesis.states))
-        char_set = [] if not char_set_init else char_set_init
+        root = _TestTrieNode()
+        tests = [(index, inp_seq) for index, inp_seq in chunk if inp_seq not in self.cache]
+        expected_outputs = hypothesis.simulate_batch([inp_seq for _, inp_seq in tests])
+        for (index, inp_seq), expected in zip(tests, expected_outputs):
+            node = root
+            tree_node = ob_tree.root if ob_tree is not None else None
+            for letter, expected_output in zip(inp_seq, expected):
+                child = node.children.get(letter)
+                if child is None:
+                    child = _TestTrieNode(expected_output)
+                    node.children[letter] = child
+                if tree_node is not None:
+                    if child.observed is _UNOBSERVED:
+                        tree_output = tree_node.get_output(letter)
+                        if tree_output is not None:
+                            child.observed = tree_output
+                    tree_node = tree_node.get_successor(letter)
+                node = child
 
-        if char_set_init:
-            for seq in char_set_init:
-                blocks = hypothesis._split_blocks(blocks, seq)
+        use_snapshots = hasattr(sul, "snapshot") and hasattr(sul, "restore")
+        passed_tests = []
+        resets = 0
+        steps = 0
+        for index, inp_seq in tests:
+            if index > failure_bound():
+                break
+
+            outputs, failed_at = root.get_outputs(inp_seq)
+            if outputs is None:
+                run = list(inp_seq)
+                node = root.get_node(inp_seq)
+                while node.children:
+                    letter, node = next(iter(node.children.items()))
+                    run.append(letter)
+
+                start, node = 0, root
+                if use_snapshots:
+                    start, node = root.get_deepest_snapshot(run)
+                if start:
+                    sul.restore(node.snapshot)
+                else:
+                    sul.post()
+                    sul.pre()
+                    resets += 1
+
+                for letter in run[start:]:
+                    node = node.children[letter]
+                    node.observed = sul.step(letter)
+                    steps += 1
+                    if node.observed != node.expected:
+                        sul.post()
+                        break
+                    if use_snapshots and len(node.children) > 1 and node.snapshot is None:
+                        node.snapshot = sul.snapshot()
+
+                outputs, failed_at = root.get_outputs(inp_seq)
+
+            if failed_at is not None:
+                return passed_tests, (index, inp_seq[:failed_at + 1]), resets, steps
+            passed_tests.append((index, inp_seq, outputs))
+
+        return passed_tests, None, resets, steps
+
+    def _update_characterization_set(self, hypothesis, witnesses):
+        """
+        Refines the characterization set of the previous hypothesis into one for the given compiled hypothesis.
+        The states are split into blocks by their outputs on the previous sequences, keeping only the sequences that
+        still split a block, so for a hypothesis that only gained a few states most of the work is reused.
+        A block that remains is split by the witness of its first two states if the learner knows one, otherwise
+        by a shortest separating sequence from the partition refinement of the hypothesis.
+        """
+        blocks = [list(range(len(hypothesis.states)))]
+        characterization_set = []
+        for sequence in self.characterization_set:
+            blocks, split = self._split_state_blocks(hypothesis, blocks, sequence)
+            if split:
+                characterization_set.append(sequence)
 
         while True:
-            try:
-                block_to_split = next(b for b in blocks if len(b) > 1)
-            except StopIteration:
+            block = next((block for block in blocks if len(block) > 1), None)
+            if block is None:
                 break
 
-            split_state1, split_state2 = block_to_split[:2]
-            dist_seq = hypothesis.find_distinguishing_seq(split_state1, split_state2, self.alphabet)
+            state_one, state_two = block[0], block[1]
+            sequence = witnesses.get((state_one, state_two))
+            if sequence is None or hypothesis.compute_outputs(sequence, state_one) == hypothesis.compute_outputs(sequence, state_two):
+                sequence = hypothesis.find_separating_sequence(state_one, state_two)
+                if sequence is None:
+                    raise Exception("Automaton is non-canonical: could not compute characterization set.")
+            blocks, _ = self._split_state_blocks(hypothesis, blocks, sequence)
+            characterization_set.append(sequence)
 
-            if dist_seq is None:
-                if raise_warning:
-                    raise Exception("Automaton is non-canonical: could not compute characterization set."
-                    "Returning None.")
-                return None
+        self.characterization_set = characterization_set
+        return list(characterization_set)
 
-            if online_suffix_closure:
-                dist_seq_closure = [tuple(dist_seq[len(dist_seq) - i - 1:]) for i in range(len(dist_seq))]
-            else:
-                dist_seq_closure = [tuple(dist_seq)]
-
-            if split_all_blocks:
-                for seq in dist_seq_closure:
-                    if seq in char_set:
-                        continue
-                    char_set.append(seq)
-                    blocks = hypothesis._split_blocks(blocks, seq)
-            else:
-                blocks.remove(block_to_split)
-                new_blocks = [block_to_split]
-                for seq in dist_seq_closure:
-                    char_set.append(seq)
-                    new_blocks = self._split_blocks(new_blocks, seq)
-                for new_block in new_blocks:
-                    blocks.append(new_block)
-
-        char_set = list(set(char_set))
-        return char_set
\ No newline at end of file
+    @staticmethod
+    def _split_state_blocks(hypothesis, blocks, sequence):
+        """
+        Splits the blocks of state ids by their outputs on the sequence, returns the new blocks and if any block split
+        """
+        new_blocks = []
+        for block in blocks:
+            if len(block) == 1:
+                new_blocks.append(block)
+                continue
+            parts = {}
+            for state in block:
+                parts.setdefault(tuple(hypothesis.compute_outputs(sequence, state)), []).append(state)
+            new_blocks.extend(parts.values())
+        return new_blocks, len(new_blocks) > len(blocks)
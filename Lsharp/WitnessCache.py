@@ -0,0 +1,69 @@
+from collections import OrderedDict
+from Apartness import Apartness
+
+class WitnessCache:
+    def __init__(self, ob_tree, max_size=100000):
+        """
+        Least recently used cache of witnesses between pairs of tree nodes.
+        Apartness is monotone (the tree only grows), so a witness stays valid once found and only non-empty
+        results are stored. The cache has to be cleared when the tree it refers to is replaced.
+        """
+        self.ob_tree = ob_tree
+        self.max_size = max_size
+        self.witnesses = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.witnesses)
+
+    def get_or_compute(self, state_one, state_two):
+        """
+        Get witness by checking cache and computing it otherwise
+        """
+        key = (state_one.id, state_two.id) if state_one.id <= state_two.id else (state_two.id, state_one.id)
+        witness = self.witnesses.get(key)
+        if witness is not None:
+            self.hits += 1
+            self.witnesses.move_to_end(key)
+            return witness
+
+        self.misses += 1
+        witness = Apartness.compute_witness(state_one, state_two, self.ob_tree)
+        if witness is None:
+            return None
+
+        witness = tuple(witness)
+        self.witnesses[key] = witness
+        if len(self.witnesses) > self.max_size:
+            self.witnesses.popitem(last=False)
+        return witness
+
+    def get_cached(self, state_one, state_two):
+        """
+        Returns the cached witness of two states without computing it, or None
+        """
+        key = (state_one.id, state_two.id) if state_one.id <= state_two.id else (state_two.id, state_one.id)
+        return self.witnesses.get(key)
+
+    def add(self, state_one, state_two, witness):
+        """
+        Stores a known witness, e.g. one restored from a checkpoint
+        """
+        key = (state_one.id, state_two.id) if state_one.id <= state_two.id else (state_two.id, state_one.id)
+        self.witnesses[key] = tuple(witness)
+        if len(self.witnesses) > self.max_size:
+            self.witnesses.popitem(last=False)
+
+    def get_hit_rate(self):
+        """
+        Returns the fraction of lookups that were answered from the cache
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self):
+        """
+        Removes all witnesses, needed when the observation tree is replaced
+        """
+        self.witnesses.clear()